@@ -0,0 +1,344 @@
+"""
+    Author: Leonardo Ribeiro
+    Python Version: 3.8.10
+
+	Benchmark of the sorting engines (and inversion counters) of the course
+
+	Every engine runs on the same seeded inputs, for each distribution and size.
+	For each run the wall time (best of "repeat" runs, without instrumentation),
+	comparisons and swaps (instrumentation.Stats) and peak memory (tracemalloc)
+	are reported as JSON.
+
+	Usage:
+		python benchmark.py run --sizes 1000 10000 100000 --output results.json
+		python benchmark.py run --engines merge_sort_bottom_up intro_sort --distributions random sorted
+		python benchmark.py compare baseline.json results.json --threshold 0.1
+		python benchmark.py test
+"""
+from typing import Callable, Dict, NamedTuple, Set
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import course_paths
+from instrumentation import Stats
+import count_inversions
+import merge_sort
+import quick_sort
+import quick_sort_different_pivot_strategy as pivot_strategies
+import radix_sort
+import sort_dispatcher
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_SEED = 42
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.10
+
+# Engines that are quadratic (and recurse n levels deep) on some distributions
+# only run on them up to this size
+DEGENERATE_SIZE_LIMIT = 2000
+
+# Measured results are compared using these fields
+COMPARED_FIELDS = ["seconds", "comparisons", "swaps", "peak_memory_bytes"]
+
+class Engine(NamedTuple):
+	# Receives (data, stats) and returns the sorted list or the inversion count.
+	# stats is None on the timed runs
+	run: Callable
+	kind: str # "sort" or "inversions"
+	# Whether the engine counts comparisons and swaps (other engines may still add counters)
+	supports_stats: bool = True
+	degenerate_on: Set[str] = set()
+
+# Input distributions
+
+def generate_input(distribution, n, seed):
+	"""
+	Generates the same input for the same (distribution, n, seed)
+	"""
+	generator = random.Random("%s-%d-%d" % (distribution, n, seed))
+	if (distribution == "random"):
+		return [generator.randrange(2**31) for _ in range(n)]
+	elif (distribution == "sorted"):
+		return list(range(n))
+	elif (distribution == "reversed"):
+		return list(range(n, 0, -1))
+	elif (distribution == "organ_pipe"):
+		return list(range(n // 2)) + list(range(n - n // 2, 0, -1))
+	elif (distribution == "few_unique"):
+		return [generator.randrange(10) for _ in range(n)]
+	elif (distribution == "sawtooth"):
+		period = max(1, n // 8)
+		return [i % period for i in range(n)]
+	raise Exception("Unknown distribution: " + str(distribution))
+
+DISTRIBUTIONS = ["random", "sorted", "reversed", "organ_pipe", "few_unique", "sawtooth"]
+
+# Engines
+
+def _in_place(sort):
+	"""
+	Adapts an in place sort(list, start, end, stats) to return the sorted list
+	"""
+	def run(data, stats):
+		sort(data, 0, len(data) - 1, stats)
+		return data
+	return run
+
+def _quick_sort_with_pivot(pivot_method):
+	def run(data, stats):
+		pivot_strategies.quick_sort(data, 0, len(data) - 1, pivot_method, stats)
+		return data
+	return run
+
+def _adaptive_merge_sort(data, stats):
+	(result, runs, gallops) = merge_sort.adaptive_merge_sort(data)
+	if (stats is not None):
+		stats.count("runs", runs)
+		stats.count("gallops", gallops)
+	return result
+
+def build_engines() -> Dict[str, Engine]:
+	sorted_inputs = {"sorted", "reversed", "organ_pipe", "sawtooth"}
+	engines = {
+		"builtin_sorted": Engine(lambda data, stats: sorted(data), "sort", supports_stats=False),
+		"merge_sort_top_down": Engine(lambda data, stats: merge_sort.merge_sort(data, "top_down", stats=stats), "sort"),
+		"merge_sort_bottom_up": Engine(lambda data, stats: merge_sort.merge_sort(data, "bottom_up", stats=stats), "sort"),
+		"merge_sort_adaptive": Engine(_adaptive_merge_sort, "sort", supports_stats=False),
+		"merge_sort_parallel": Engine(lambda data, stats: merge_sort.merge_sort(data, "parallel"), "sort", supports_stats=False),
+		"quick_sort": Engine(_in_place(quick_sort.quick_sort), "sort", degenerate_on={"few_unique"}),
+		"quick_sort_three_way": Engine(
+			_in_place(lambda data, start, end, stats: quick_sort.quick_sort(data, start, end, stats, three_way=True)),
+			"sort"
+		),
+		"dual_pivot_quick_sort": Engine(_in_place(quick_sort.dual_pivot_quick_sort), "sort", degenerate_on={"few_unique"}),
+		"intro_sort": Engine(_in_place(quick_sort.intro_sort), "sort"),
+		"insertion_sort": Engine(_in_place(quick_sort.insertion_sort), "sort", degenerate_on=set(DISTRIBUTIONS) - {"sorted"}),
+		"quick_sort_parallel": Engine(
+			_in_place(lambda data, start, end, stats: quick_sort.parallel_quick_sort(data, start, end)),
+			"sort",
+			supports_stats=False
+		),
+		"radix_sort_lsd": Engine(_in_place(radix_sort.radix_sort), "sort", supports_stats=False),
+		"radix_sort_msd": Engine(
+			_in_place(lambda data, start, end, stats: radix_sort.radix_sort(data, start, end, stats, "msd", use_numpy=False)),
+			"sort",
+			supports_stats=False
+		),
+		"dispatcher_sort": Engine(lambda data, stats: sort_dispatcher.sort(data), "sort", supports_stats=False),
+		"count_inversions": Engine(lambda data, stats: count_inversions.count_inversions(data), "inversions", supports_stats=False),
+		"sort_and_count_inv": Engine(lambda data, stats: count_inversions.sort_and_count_inv(data)[1], "inversions", supports_stats=False),
+	}
+	for pivot_method in pivot_strategies.PIVOT_STRATEGIES:
+		degenerate_on = {"few_unique"}
+		if (pivot_method in ("from_start", "from_end")):
+			degenerate_on = degenerate_on | sorted_inputs
+		engines["quick_sort_" + pivot_method] = Engine(_quick_sort_with_pivot(pivot_method), "sort", degenerate_on=degenerate_on)
+	return engines
+
+# Measurement
+
+def measure(engine: Engine, data, repeat, reference):
+	"""
+	Runs an engine on copies of data and returns its measurements
+	reference is the expected result (sorted list or inversion count)
+	"""
+	best_time = None
+	for _ in range(repeat):
+		copy = data[:]
+		start = time.perf_counter()
+		engine.run(copy, None)
+		elapsed = time.perf_counter() - start
+		best_time = elapsed if best_time is None else min(best_time, elapsed)
+
+	# Instrumented run, also used to check the result
+	stats = Stats()
+	copy = data[:]
+	tracemalloc.start()
+	result = engine.run(copy, stats)
+	(_, peak) = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	return {
+		"status": "ok" if result == reference else "wrong_result",
+		"seconds": best_time,
+		"comparisons": stats.comparisons if engine.supports_stats else None,
+		"swaps": stats.swaps if engine.supports_stats else None,
+		"max_depth": stats.max_depth if engine.supports_stats else None,
+		"counters": stats.counters,
+		"peak_memory_bytes": peak,
+	}
+
+def run_benchmark(sizes, distributions, engine_names, repeat = DEFAULT_REPEAT, seed = DEFAULT_SEED, log = print):
+	"""
+	Runs every engine on every (distribution, size) input
+	Returns the results as a JSON serializable dict
+	"""
+	engines = build_engines()
+	unknown = [name for name in engine_names if name not in engines]
+	if (unknown):
+		raise Exception("Unknown engines: " + ", ".join(unknown))
+	sys.setrecursionlimit(max(sys.getrecursionlimit(), 2*DEGENERATE_SIZE_LIMIT + 1000))
+
+	results = []
+	for n in sizes:
+		for distribution in distributions:
+			data = generate_input(distribution, n, seed)
+			references = {"sort": sorted(data), "inversions": count_inversions.count_inversions(data)}
+			for name in engine_names:
+				engine = engines[name]
+				entry = {"engine": name, "distribution": distribution, "size": n}
+				if (distribution in engine.degenerate_on and n > DEGENERATE_SIZE_LIMIT):
+					entry["status"] = "skipped"
+				else:
+					try:
+						entry.update(measure(engine, data, repeat, references[engine.kind]))
+					except (RecursionError, MemoryError) as error:
+						entry["status"] = "error"
+						entry["error"] = type(error).__name__
+				results.append(entry)
+				if (log is not None):
+					log(format_entry(entry))
+	return {
+		"seed": seed,
+		"repeat": repeat,
+		"python": platform.python_version(),
+		"machine": platform.machine(),
+		"cpu_count": os.cpu_count(),
+		"results": results,
+	}
+
+def format_entry(entry):
+	description = "%-32s %-11s n=%-9d" % (entry["engine"], entry["distribution"], entry["size"])
+	if (entry["status"] != "ok"):
+		return description + " " + entry["status"] + (" (" + entry["error"] + ")" if "error" in entry else "")
+	return description + " %9.4fs  comparisons: %-12s swaps: %-12s peak: %d KB" % (
+		entry["seconds"], entry["comparisons"], entry["swaps"], entry["peak_memory_bytes"] // 1024
+	)
+
+# Comparison of result files
+
+def compare_results(baseline, current, threshold = DEFAULT_THRESHOLD):
+	"""
+	Compares two benchmark result dicts
+	Returns the list of regressions: measurements more than "threshold"
+	(relative) above the baseline, and runs that stopped working
+	"""
+	baseline_entries = {
+		(entry["engine"], entry["distribution"], entry["size"]): entry
+		for entry in baseline["results"]
+	}
+	regressions = []
+	for entry in current["results"]:
+		key = (entry["engine"], entry["distribution"], entry["size"])
+		if (key not in baseline_entries):
+			continue
+		old_entry = baseline_entries[key]
+		if (old_entry["status"] == "ok" and entry["status"] != "ok"):
+			regressions.append({"key": key, "field": "status", "baseline": "ok", "current": entry["status"]})
+			continue
+		if (old_entry["status"] != "ok" or entry["status"] != "ok"):
+			continue
+		for field in COMPARED_FIELDS:
+			(old_value, value) = (old_entry.get(field), entry.get(field))
+			if (old_value is None or value is None):
+				continue
+			if (value > old_value * (1 + threshold)):
+				regressions.append({
+					"key": key,
+					"field": field,
+					"baseline": old_value,
+					"current": value,
+					"change": (value - old_value) / old_value if old_value else None,
+				})
+	return regressions
+
+def format_regression(regression):
+	(engine, distribution, size) = regression["key"]
+	change = regression.get("change")
+	return "REGRESSION %s %s n=%d - %s: %s -> %s%s" % (
+		engine, distribution, size, regression["field"], regression["baseline"], regression["current"],
+		" (+%.1f%%)" % (100 * change) if change is not None else ""
+	)
+
+# Tests
+
+def run_tests():
+	"""
+	Runs all engines on small inputs and checks the comparison of result files
+	"""
+	print("Running tests...")
+	engine_names = [*build_engines()]
+	results = run_benchmark([0, 1, 300], DISTRIBUTIONS, engine_names, repeat=1, log=None)
+	failed = [entry for entry in results["results"] if entry["status"] != "ok"]
+	if (not failed and len(results["results"]) == 3 * len(DISTRIBUTIONS) * len(engine_names)):
+		print("PASSED run_benchmark - every engine is correct on every distribution")
+	else:
+		print("--> FAILED run_benchmark -", failed)
+
+	if (generate_input("random", 100, 1) == generate_input("random", 100, 1)
+		and generate_input("random", 100, 1) != generate_input("random", 100, 2)):
+		print("PASSED generate_input is seeded")
+	else:
+		print("--> FAILED generate_input is seeded")
+
+	slower = json.loads(json.dumps(results))
+	entry = slower["results"][-1]
+	entry["seconds"] = entry["seconds"] * 2 + 1
+	regressions = compare_results(results, slower)
+	if (len(regressions) == 1 and regressions[0]["field"] == "seconds" and not compare_results(results, results)):
+		print("PASSED compare_results")
+	else:
+		print("--> FAILED compare_results -", regressions)
+
+def main(arguments = None):
+	parser = argparse.ArgumentParser(description="Benchmark of the sorting engines")
+	commands = parser.add_subparsers(dest="command", required=True)
+
+	run_parser = commands.add_parser("run", help="run the benchmark")
+	run_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+	run_parser.add_argument("--distributions", nargs="+", default=DISTRIBUTIONS, choices=DISTRIBUTIONS)
+	run_parser.add_argument("--engines", nargs="+", default=None, help="default: all")
+	run_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+	run_parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+	run_parser.add_argument("--output", default=None, help="JSON file for the results (default: stdout)")
+
+	compare_parser = commands.add_parser("compare", help="flag regressions between two result files")
+	compare_parser.add_argument("baseline")
+	compare_parser.add_argument("current")
+	compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+	commands.add_parser("test", help="run the self tests")
+
+	arguments = parser.parse_args(arguments)
+	if (arguments.command == "run"):
+		engine_names = arguments.engines or [*build_engines()]
+		log = (lambda line: print(line, file=sys.stderr))
+		results = run_benchmark(arguments.sizes, arguments.distributions, engine_names, arguments.repeat, arguments.seed, log)
+		if (arguments.output):
+			with open(arguments.output, "w") as file:
+				json.dump(results, file, indent=2)
+		else:
+			print(json.dumps(results, indent=2))
+	elif (arguments.command == "compare"):
+		with open(arguments.baseline) as file:
+			baseline = json.load(file)
+		with open(arguments.current) as file:
+			current = json.load(file)
+		regressions = compare_results(baseline, current, arguments.threshold)
+		for regression in regressions:
+			print(format_regression(regression))
+		print("%d regression(s)" % len(regressions))
+		return 1 if regressions else 0
+	elif (arguments.command == "test"):
+		run_tests()
+	return 0
+
+# Runs code
+if __name__ == "__main__":
+	sys.exit(main())
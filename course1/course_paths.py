@@ -0,0 +1,26 @@
+"""
+    Author: Leonardo Ribeiro
+    Python Version: 3.8.10
+
+	Import paths of the course
+
+	Importing this module adds the course folder and every week folder (and its
+	assignment folder) to sys.path, so any script can import the modules of the
+	other weeks by name. Scripts inside a week folder only need to find this file:
+		sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+		import course_paths
+"""
+import os
+import sys
+
+COURSE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+WEEK_DIRECTORIES = [
+	os.path.join(COURSE_DIRECTORY, week, folder)
+	for week in ("week1", "week2", "week3", "week4")
+	for folder in ("", "assignment")
+]
+
+for _directory in [COURSE_DIRECTORY] + WEEK_DIRECTORIES:
+	if (os.path.isdir(_directory) and _directory not in sys.path):
+		sys.path.append(_directory)
@@ -0,0 +1,95 @@
+"""
+    Author: Leonardo Ribeiro
+    Python Version: 3.8.10
+
+	Instrumentation for the algorithms of the course
+
+	The sorting, selection and multiplication functions accept an optional
+	"stats" argument. When it's None (default) nothing is counted and the only
+	cost is one "is None" check per call (counts are derived after the loops,
+	never incremented inside them). When a Stats object is given, the algorithm
+	adds its work to it, so each call (or thread/process) can use its own collector.
+
+	Usage:
+		stats = Stats("quick_sort")
+		quick_sort(list, 0, len(list) - 1, stats=stats)
+		print(stats.to_json())
+"""
+import json
+
+class Stats:
+	"""
+	Collects the work done by one algorithm call
+	"""
+
+	def __init__(self, name = ""):
+		self.name = name
+		self.reset()
+
+	def reset(self):
+		self.comparisons = 0
+		self.swaps = 0
+		self.allocations = 0 # List slots (or matrix cells) allocated
+		self.calls = 0 # Recursive calls (or iterations of iterative versions)
+		self.depth = 0
+		self.max_depth = 0
+		self.counters = {} # Algorithm specific counts
+
+	def enter(self):
+		"""
+		Called at the beginning of each recursive call
+		"""
+		self.calls += 1
+		self.depth += 1
+		if (self.depth > self.max_depth):
+			self.max_depth = self.depth
+
+	def exit(self):
+		"""
+		Called when a recursive call returns
+		"""
+		self.depth -= 1
+
+	def count(self, name, amount = 1):
+		"""
+		Adds to an algorithm specific counter
+		"""
+		self.counters[name] = self.counters.get(name, 0) + amount
+
+	def to_dict(self):
+		return {
+			"name": self.name,
+			"comparisons": self.comparisons,
+			"swaps": self.swaps,
+			"allocations": self.allocations,
+			"calls": self.calls,
+			"max_depth": self.max_depth,
+			"counters": dict(self.counters),
+		}
+
+	def to_json(self, **kwargs):
+		return json.dumps(self.to_dict(), **kwargs)
+
+	def __repr__(self):
+		return "Stats(" + self.to_json() + ")"
+
+def test_stats():
+	stats = Stats("test")
+	stats.enter()
+	stats.enter()
+	stats.exit()
+	stats.enter()
+	stats.exit()
+	stats.exit()
+	stats.comparisons += 3
+	stats.count("gallops", 2)
+	result = json.loads(stats.to_json())
+	if (result["calls"] == 3 and result["max_depth"] == 2 and stats.depth == 0
+		and result["comparisons"] == 3 and result["counters"] == {"gallops": 2}):
+		print("PASSED Stats")
+	else:
+		print("--> FAILED Stats -", stats)
+
+# Runs code
+if __name__ == "__main__":
+	test_stats()
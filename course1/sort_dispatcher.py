@@ -0,0 +1,253 @@
+"""
+    Author: Leonardo Ribeiro
+    Python Version: 3.8.10
+
+	Adaptive sort dispatcher
+
+	sort(data) samples a few characteristics of the input and sorts it with the
+	engine of the course that fits it best:
+
+	- insertion sort - tiny inputs
+	- adaptive merge sort - sorted, reversed or almost sorted inputs (few runs)
+	- radix sort - integers
+	- three way quick sort - many duplicates
+	- intro sort - everything else
+
+	The thresholds can be tuned from a benchmark.py result file:
+		python benchmark.py run --output results.json
+		python sort_dispatcher.py tune results.json --output thresholds.json
+"""
+from typing import NamedTuple
+import argparse
+import json
+import logging
+import random
+import sys
+
+import course_paths
+import merge_sort
+import quick_sort
+import radix_sort
+
+logger = logging.getLogger("sort_dispatcher")
+
+class DispatchThresholds(NamedTuple):
+	# Inputs up to this size are insertion sorted
+	insertion_max_size: int = 16
+	# Sampled descents / sampled pairs at most this (or at least 1 - this) means presorted.
+	# A negative value disables the adaptive merge sort
+	presorted_max_descent_ratio: float = 0.05
+	# Integer inputs from this size go to radix sort
+	radix_min_size: int = 256
+	# Repeated values in the sample from this ratio go to three way quick sort
+	duplicate_min_ratio: float = 0.5
+	# Number of elements sampled (for presortedness, in 4 contiguous windows)
+	sample_size: int = 256
+
+DEFAULT_THRESHOLDS = DispatchThresholds()
+
+class InputFeatures(NamedTuple):
+	size: int
+	integers: bool
+	descent_ratio: float
+	duplicate_ratio: float
+
+def sample_features(data, sample_size = DEFAULT_THRESHOLDS.sample_size) -> InputFeatures:
+	"""
+	Estimates the input characteristics looking at about sample_size elements
+
+	- integers: every sampled element is an int
+	- descent_ratio: fraction of adjacent pairs out of order, in 4 contiguous windows
+	(0 for sorted inputs, 1 for reversed inputs)
+	- duplicate_ratio: fraction of repeated values in a random sample
+	"""
+	n = len(data)
+	if (n <= sample_size):
+		sample = data
+		windows = [(0, n)]
+	else:
+		generator = random.Random(n)
+		sample = [data[i] for i in generator.sample(range(n), sample_size)]
+		window_size = sample_size // 4
+		windows = [(start, start + window_size) for start in range(0, n - window_size + 1, (n - window_size) // 3)][:4]
+
+	descents = 0
+	pairs = 0
+	for (start, end) in windows:
+		for i in range(start + 1, end):
+			if (data[i] < data[i - 1]):
+				descents += 1
+		pairs += max(0, end - start - 1)
+
+	return InputFeatures(
+		size=n,
+		integers=all(type(value) is int for value in sample),
+		descent_ratio=descents / pairs if pairs > 0 else 0.0,
+		duplicate_ratio=1 - len(set(sample)) / len(sample) if len(sample) > 0 else 0.0,
+	)
+
+def choose_engine(features: InputFeatures, thresholds: DispatchThresholds = DEFAULT_THRESHOLDS):
+	"""
+	Name of the engine used for an input with these features
+	"""
+	if (features.size <= thresholds.insertion_max_size):
+		return "insertion_sort"
+	presorted_ratio = thresholds.presorted_max_descent_ratio
+	if (presorted_ratio >= 0 and (features.descent_ratio <= presorted_ratio or features.descent_ratio >= 1 - presorted_ratio)):
+		return "adaptive_merge_sort"
+	if (features.integers and features.size >= thresholds.radix_min_size):
+		return "radix_sort"
+	if (features.duplicate_ratio >= thresholds.duplicate_min_ratio):
+		return "three_way_quick_sort"
+	return "intro_sort"
+
+def _run_engine(engine, data):
+	end = len(data) - 1
+	if (engine == "insertion_sort"):
+		quick_sort.insertion_sort(data, 0, end)
+	elif (engine == "adaptive_merge_sort"):
+		merge_sort.adaptive_merge_sort(data)
+	elif (engine == "radix_sort"):
+		radix_sort.radix_sort(data, 0, end)
+	elif (engine == "three_way_quick_sort"):
+		quick_sort.quick_sort(data, 0, end, three_way=True)
+	else:
+		quick_sort.intro_sort(data, 0, end)
+
+def sort(data, thresholds: DispatchThresholds = DEFAULT_THRESHOLDS):
+	"""
+	Sorts the list in place with the engine chosen by choose_engine and returns it
+	"""
+	features = sample_features(data, thresholds.sample_size)
+	engine = choose_engine(features, thresholds)
+	if (engine == "radix_sort" and not all(type(value) is int for value in data)):
+		# The sample only had integers, but other numbers are hidden in the list
+		features = features._replace(integers=False)
+		engine = choose_engine(features, thresholds)
+	logger.info("sort - %s -> %s", features, engine)
+	_run_engine(engine, data)
+	return data
+
+# Tuning
+
+def _best_time(results, engine, distribution, size):
+	for entry in results["results"]:
+		if ((entry["engine"], entry["distribution"], entry["size"]) == (engine, distribution, size) and entry["status"] == "ok"):
+			return entry["seconds"]
+	return None
+
+def tune_thresholds(results, thresholds: DispatchThresholds = DEFAULT_THRESHOLDS) -> DispatchThresholds:
+	"""
+	Adjusts the thresholds with a benchmark.py result dict, comparing each
+	specialized engine with intro_sort on the sizes that were measured.
+	Thresholds without measurements are kept
+	"""
+	sizes = sorted({entry["size"] for entry in results["results"]})
+
+	def wins(engine, distribution, size):
+		engine_time = _best_time(results, engine, distribution, size)
+		intro_sort_time = _best_time(results, "intro_sort", distribution, size)
+		if (engine_time is None or intro_sort_time is None):
+			return None
+		return engine_time < intro_sort_time
+
+	# Largest size where insertion sort still wins on random inputs
+	insertion_wins = [size for size in sizes if wins("insertion_sort", "random", size)]
+	if (insertion_wins):
+		thresholds = thresholds._replace(insertion_max_size=max(insertion_wins))
+
+	# Smallest size from which radix sort wins on random inputs
+	radix_results = [(size, wins("radix_sort_lsd", "random", size)) for size in sizes]
+	radix_results = [(size, result) for (size, result) in radix_results if result is not None]
+	if (radix_results):
+		winning = [size for (size, result) in radix_results if result]
+		thresholds = thresholds._replace(radix_min_size=min(winning) if winning else sys.maxsize)
+
+	# Adaptive merge sort and three way quick sort are kept only if they win at most sizes
+	for (engine, distribution, field, disabled) in (
+		("merge_sort_adaptive", "sorted", "presorted_max_descent_ratio", -1.0),
+		("quick_sort_three_way", "few_unique", "duplicate_min_ratio", 2.0),
+	):
+		outcomes = [wins(engine, distribution, size) for size in sizes]
+		outcomes = [outcome for outcome in outcomes if outcome is not None]
+		if (outcomes and sum(outcomes) * 2 < len(outcomes)):
+			thresholds = thresholds._replace(**{field: disabled})
+		elif (outcomes and getattr(thresholds, field) == disabled):
+			thresholds = thresholds._replace(**{field: getattr(DEFAULT_THRESHOLDS, field)})
+	return thresholds
+
+def load_thresholds(path) -> DispatchThresholds:
+	with open(path) as file:
+		return DispatchThresholds(**json.load(file))
+
+# Tests
+
+def run_tests():
+	print("Running tests...")
+	generator = random.Random(1)
+	inputs = {
+		"tiny": ([5, 3, 1], "insertion_sort"),
+		"sorted": (list(range(5000)), "adaptive_merge_sort"),
+		"reversed": (list(range(5000, 0, -1)), "adaptive_merge_sort"),
+		"integers": ([generator.randrange(10**9) for _ in range(5000)], "radix_sort"),
+		"few_unique_floats": ([float(generator.randrange(5)) for _ in range(5000)], "three_way_quick_sort"),
+		"floats": ([generator.random() for _ in range(5000)], "intro_sort"),
+	}
+	for (name, (data, expected_engine)) in inputs.items():
+		engine = choose_engine(sample_features(data))
+		expected_sorted = sorted(data)
+		if (engine == expected_engine and sort(data) == expected_sorted):
+			print("PASSED sort", name, "->", engine)
+		else:
+			print("--> FAILED sort", name, "->", engine, "Expected:", expected_engine)
+
+	# A float hidden from the sample (20000 values also reach radix sort's NumPy backend)
+	for n in (5000, 20000):
+		data = [generator.randrange(10**9) for _ in range(n)]
+		data[1234] = 0.5
+		expected_sorted = sorted(data)
+		if (sort(data) == expected_sorted):
+			print("PASSED sort with a non sampled float - n =", n)
+		else:
+			print("--> FAILED sort with a non sampled float - n =", n)
+
+	results = {"results": [
+		{"engine": engine, "distribution": distribution, "size": size, "status": "ok", "seconds": seconds}
+		for (engine, distribution, size, seconds) in (
+			("intro_sort", "random", 100, 1.0), ("insertion_sort", "random", 100, 0.5),
+			("intro_sort", "random", 1000, 1.0), ("insertion_sort", "random", 1000, 2.0),
+			("radix_sort_lsd", "random", 100, 2.0), ("radix_sort_lsd", "random", 1000, 0.5),
+			("intro_sort", "sorted", 1000, 1.0), ("merge_sort_adaptive", "sorted", 1000, 2.0),
+		)
+	]}
+	tuned = tune_thresholds(results)
+	if (tuned.insertion_max_size == 100 and tuned.radix_min_size == 1000
+		and tuned.presorted_max_descent_ratio < 0 and tuned.duplicate_min_ratio == DEFAULT_THRESHOLDS.duplicate_min_ratio):
+		print("PASSED tune_thresholds")
+	else:
+		print("--> FAILED tune_thresholds -", tuned)
+
+def main(arguments = None):
+	parser = argparse.ArgumentParser(description="Adaptive sort dispatcher")
+	commands = parser.add_subparsers(dest="command", required=True)
+	tune_parser = commands.add_parser("tune", help="tune the thresholds from a benchmark.py result file")
+	tune_parser.add_argument("results")
+	tune_parser.add_argument("--output", default=None, help="JSON file for the thresholds (default: stdout)")
+	commands.add_parser("test", help="run the self tests")
+
+	arguments = parser.parse_args(arguments)
+	if (arguments.command == "tune"):
+		with open(arguments.results) as file:
+			thresholds = tune_thresholds(json.load(file))
+		output = json.dumps(thresholds._asdict(), indent=2)
+		if (arguments.output):
+			with open(arguments.output, "w") as file:
+				file.write(output)
+		else:
+			print(output)
+	elif (arguments.command == "test"):
+		run_tests()
+
+# Runs code
+if __name__ == "__main__":
+	main()
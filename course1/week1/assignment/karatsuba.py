@@ -1,17 +1,53 @@
 """
     Author: Leonardo Ribeiro
     Python Version: 3.8.10
+
+	Karatsuba multiplication
+
+	- decimal (assignment): splits the numbers in halves of decimal digits,
+	down to single digit multiplications
+	- binary: splits in halves of bits with bit_length, shifts and masks (no
+	string conversions or powers of 10) and multiplies natively once the
+	operands fit in limb_threshold limbs of 64 bits
 """
+from typing import Literal
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+import course_paths
+from instrumentation import Stats
+
+# Type definitions
+KaratsubaBase = Literal["decimal", "binary"]
 
-def karatsuba_multiplication(number1: int, number2: int):
+LIMB_BITS = 64
+
+# Operands of up to this many limbs are multiplied natively by the binary version
+NATIVE_MULTIPLY_LIMBS = 32
+
+def karatsuba_multiplication(number1: int, number2: int, stats = None, base: KaratsubaBase = "decimal"):
 	"""
 	Karatsuba multiplication algorithm
 	"""
+	if (base == "binary"):
+		return binary_karatsuba_multiplication(number1, number2, stats)
+	if (base != "decimal"):
+		raise Exception("Unknown base: " + str(base))
 
 	# Base case
 	if (number1 < 10 and number2 < 10):
+		if (stats is not None):
+			stats.enter()
+			stats.count("digit_multiplications")
+			stats.exit()
 		return number1 * number2
 
+	if (stats is not None):
+		stats.enter()
+
 	n = max(len(str(number1)), len(str(number2)))
 	n_2 = n // 2
 
@@ -20,25 +56,120 @@ def karatsuba_multiplication(number1: int, number2: int):
 	c = number2 // pow(10, n_2)
 	d = number2 % pow(10, n_2)
 
-	ac = karatsuba_multiplication(a, c)
-	bd = karatsuba_multiplication(b, d)
-	ad_bc = karatsuba_multiplication(a + b, c + d)
+	ac = karatsuba_multiplication(a, c, stats)
+	bd = karatsuba_multiplication(b, d, stats)
+	ad_bc = karatsuba_multiplication(a + b, c + d, stats)
 
 	ad_plus_bc = ad_bc - ac - bd
 
+	if (stats is not None):
+		stats.exit()
+
 	return pow(10, 2*n_2) * ac + pow(10, n_2) * ad_plus_bc + bd
 
+def binary_karatsuba_multiplication(number1: int, number2: int, stats = None, limb_threshold = NATIVE_MULTIPLY_LIMBS):
+	"""
+	Karatsuba multiplication in base 2^64
+	limb_threshold - operands of up to this many 64 bit limbs are multiplied natively
+	"""
+	if (limb_threshold < 1):
+		raise Exception("limb_threshold must be at least 1")
+	product = _binary_karatsuba(abs(number1), abs(number2), limb_threshold * LIMB_BITS, stats)
+	return -product if (number1 < 0) != (number2 < 0) else product
+
+def _binary_karatsuba(number1, number2, threshold_bits, stats):
+	if (stats is not None):
+		stats.enter()
+
+	n = max(number1.bit_length(), number2.bit_length())
+
+	# Base case
+	if (n <= threshold_bits):
+		if (stats is not None):
+			stats.count("native_multiplications")
+			stats.exit()
+		return number1 * number2
+
+	n_2 = n // 2
+	mask = (1 << n_2) - 1
+
+	a = number1 >> n_2
+	b = number1 & mask
+	c = number2 >> n_2
+	d = number2 & mask
+
+	ac = _binary_karatsuba(a, c, threshold_bits, stats)
+	bd = _binary_karatsuba(b, d, threshold_bits, stats)
+	ad_bc = _binary_karatsuba(a + b, c + d, threshold_bits, stats)
+
+	if (stats is not None):
+		stats.exit()
+
+	return (ac << 2*n_2) + ((ad_bc - ac - bd) << n_2) + bd
+
 def test(number1, number2):
-	result = karatsuba_multiplication(number1, number2)
+	stats = Stats("karatsuba_multiplication")
+	result = karatsuba_multiplication(number1, number2, stats)
 	expected_result = number1 * number2
-	if (result == expected_result):
-		print("PASSED: ", number1, "*", number2, " = ", result)
+	if (result == expected_result and stats.depth == 0 and stats.counters["digit_multiplications"] > 0):
+		print("PASSED: ", number1, "*", number2, " = ", result, "- Calls:", stats.calls)
 	else:
 		print("--> FAILED: ", number1, "*", number2)
 		print("result: ", result, "expected result: ", expected_result)
 
-test(8568, 2386)
-test(2875, 68)
-test(2654684185, 32418854854555)
-test(484652, 1241579)
-test(3141592653589793238462643383279502884197169399375105820974944592, 2718281828459045235360287471352662497757247093699959574966967627)
\ No newline at end of file
+def test_binary():
+	passed = True
+	for _ in range(200):
+		number1 = random.getrandbits(random.randint(0, 20000)) * random.choice([1, -1])
+		number2 = random.getrandbits(random.randint(0, 20000)) * random.choice([1, -1])
+		limb_threshold = random.randint(1, 8)
+		if (binary_karatsuba_multiplication(number1, number2, limb_threshold=limb_threshold) != number1 * number2):
+			passed = False
+			break
+	if (passed):
+		print("PASSED binary karatsuba_multiplication")
+	else:
+		print("--> FAILED binary karatsuba_multiplication - Limb threshold:", limb_threshold)
+
+	# 64 limbs with a 32 limb threshold: ac and bd are native, (a + b)(c + d)
+	# has one carry bit too many and splits once more (3 native multiplications)
+	number1 = (1 << (64 * 64)) - 1
+	stats = Stats("binary_karatsuba_multiplication")
+	result = karatsuba_multiplication(number1, number1, stats, base="binary")
+	if (result == number1 * number1 and stats.depth == 0 and stats.counters["native_multiplications"] == 5):
+		print("PASSED binary karatsuba_multiplication instrumentation - Calls:", stats.calls)
+	else:
+		print("--> FAILED binary karatsuba_multiplication instrumentation -", stats)
+
+def run_benchmark():
+	"""
+	Run with: python karatsuba.py benchmark
+	"""
+	print()
+	for digits in (2000, 100000):
+		number1 = random.randrange(10**(digits - 1), 10**digits)
+		number2 = random.randrange(10**(digits - 1), 10**digits)
+		print("Benchmark - %d digit operands" % digits)
+		engines = [("binary", lambda: binary_karatsuba_multiplication(number1, number2)),
+			("native", lambda: number1 * number2)]
+		if (digits <= 2000):
+			engines.insert(0, ("decimal", lambda: karatsuba_multiplication(number1, number2)))
+		for (name, multiply) in engines:
+			start = time.perf_counter()
+			multiply()
+			print("%-8s %.4fs" % (name, time.perf_counter() - start))
+	print("(decimal is skipped at 100000 digits, its str() conversions at every level are quadratic)")
+
+def main():
+	test(8568, 2386)
+	test(2875, 68)
+	test(2654684185, 32418854854555)
+	test(484652, 1241579)
+	test(3141592653589793238462643383279502884197169399375105820974944592, 2718281828459045235360287471352662497757247093699959574966967627)
+	test_binary()
+	if ("benchmark" in sys.argv[1:]):
+		run_benchmark()
+
+# Runs code
+if __name__ == "__main__":
+	main()
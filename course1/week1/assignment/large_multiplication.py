@@ -0,0 +1,395 @@
+"""
+    Author: Leonardo Ribeiro
+    Python Version: 3.8.10
+
+	Multiplication of very large integers
+
+	- Toom-3: splits the operands in 3 parts and multiplies the polynomials with
+	5 recursive products (points 0, 1, -1, -2 and infinity) instead of 9.
+	Time complexity: O(n^1.465)
+	- NTT: splits the operands in 16 bit limbs and convolves them with number
+	theoretic transforms modulo 3 primes, the coefficients are recovered with the
+	chinese remainder theorem (Garner). Time complexity: O(n*log(n))
+	- multiply: picks native, binary Karatsuba, Toom-3 or NTT by operand size
+
+	The thresholds are in bits, run "python large_multiplication.py benchmark"
+	to see where the crossovers are on the current machine.
+"""
+from array import array
+import os
+import random
+import sys
+import time
+
+from karatsuba import binary_karatsuba_multiplication
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+import course_paths
+from instrumentation import Stats
+
+# NumPy is optional, only used by the vectorized NTT
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# (prime, primitive root), each prime is c*2^k + 1 with k >= 23.
+# A coefficient is at most n*(2^16)^2 < p1*p2*p3 for transforms of up to 2^23 limbs
+NTT_PRIMES = [(998244353, 3), (167772161, 3), (469762049, 3)]
+NTT_MAX_LENGTH = 1 << 23
+NTT_MAX_BITS = 16 * NTT_MAX_LENGTH // 2
+
+# multiply uses each engine from these operand sizes (bits), measured with the benchmark.
+# Native multiplication is already Karatsuba (in C) and binary Karatsuba didn't beat it
+# at any size, so its range is empty unless KARATSUBA_THRESHOLD_BITS is lowered.
+# The NTT (NumPy transforms) only catches up with Toom-3 at its biggest operands:
+# 24.1s against 21.8s at 2^25 bits, 48.5s against 49.1s at 2^26 = NTT_MAX_BITS
+KARATSUBA_THRESHOLD_BITS = 1 << 18
+TOOM3_THRESHOLD_BITS = 1 << 18
+NTT_THRESHOLD_BITS = NTT_MAX_BITS
+
+# Toom-3 parts smaller than this are multiplied with binary Karatsuba
+TOOM3_CUTOFF_BITS = 1 << 14
+
+def multiply(number1: int, number2: int, stats = None):
+	"""
+	Multiplies with the engine suited to the size of the biggest operand
+	"""
+	n = max(abs(number1).bit_length(), abs(number2).bit_length())
+	if (n < KARATSUBA_THRESHOLD_BITS):
+		engine = "native"
+		result = number1 * number2
+	elif (n < TOOM3_THRESHOLD_BITS):
+		engine = "karatsuba"
+		result = binary_karatsuba_multiplication(number1, number2)
+	elif (n < NTT_THRESHOLD_BITS or n > NTT_MAX_BITS):
+		engine = "toom3"
+		result = toom3_multiplication(number1, number2)
+	else:
+		engine = "ntt"
+		result = ntt_multiplication(number1, number2)
+	if (stats is not None):
+		stats.count(engine)
+	return result
+
+# Toom-3
+
+def toom3_multiplication(number1: int, number2: int, stats = None, cutoff_bits = TOOM3_CUTOFF_BITS):
+	"""
+	Toom-Cook 3 way multiplication, parts below cutoff_bits go to binary Karatsuba
+	"""
+	if (stats is not None):
+		stats.enter()
+
+	sign = -1 if (number1 < 0) != (number2 < 0) else 1
+	number1 = abs(number1)
+	number2 = abs(number2)
+	n = max(number1.bit_length(), number2.bit_length())
+
+	# Base case
+	if (n <= cutoff_bits):
+		if (stats is not None):
+			stats.count("karatsuba_multiplications")
+			stats.exit()
+		return sign * binary_karatsuba_multiplication(number1, number2)
+
+	# number = m2*x^2 + m1*x + m0, with x = 2^k
+	k = (n + 2) // 3
+	mask = (1 << k) - 1
+	(a0, a1, a2) = (number1 & mask, (number1 >> k) & mask, number1 >> (2*k))
+	(b0, b1, b2) = (number2 & mask, (number2 >> k) & mask, number2 >> (2*k))
+
+	# Evaluation at 0, 1, -1, -2 and infinity
+	a02 = a0 + a2
+	(a_1, a_minus1) = (a02 + a1, a02 - a1)
+	a_minus2 = ((a_minus1 + a2) << 1) - a0
+	b02 = b0 + b2
+	(b_1, b_minus1) = (b02 + b1, b02 - b1)
+	b_minus2 = ((b_minus1 + b2) << 1) - b0
+
+	r_0 = toom3_multiplication(a0, b0, stats, cutoff_bits)
+	r_1 = toom3_multiplication(a_1, b_1, stats, cutoff_bits)
+	r_minus1 = toom3_multiplication(a_minus1, b_minus1, stats, cutoff_bits)
+	r_minus2 = toom3_multiplication(a_minus2, b_minus2, stats, cutoff_bits)
+	r_infinity = toom3_multiplication(a2, b2, stats, cutoff_bits)
+
+	# Interpolation (Bodrato's sequence, every division is exact)
+	r3 = (r_minus2 - r_1) // 3
+	r1 = (r_1 - r_minus1) >> 1
+	r2 = r_minus1 - r_0
+	r3 = ((r2 - r3) >> 1) + (r_infinity << 1)
+	r2 = r2 + r1 - r_infinity
+	r1 = r1 - r3
+
+	if (stats is not None):
+		stats.exit()
+
+	result = r_0 + (r1 << k) + (r2 << (2*k)) + (r3 << (3*k)) + (r_infinity << (4*k))
+	return sign * result
+
+# NTT
+
+def ntt_multiplication(number1: int, number2: int, use_numpy = None):
+	"""
+	Multiplies by convolving the 16 bit limbs of the operands with NTTs
+
+	use_numpy - None uses NumPy if it's installed
+	"""
+	sign = -1 if (number1 < 0) != (number2 < 0) else 1
+	number1 = abs(number1)
+	number2 = abs(number2)
+	if (number1 == 0 or number2 == 0):
+		return 0
+	if (use_numpy is None):
+		use_numpy = numpy is not None
+
+	limbs1 = _to_limbs(number1)
+	limbs2 = _to_limbs(number2)
+	length = 1
+	while (length < len(limbs1) + len(limbs2) - 1):
+		length <<= 1
+	if (length > NTT_MAX_LENGTH):
+		raise Exception("Operands too big for the NTT primes: %d limbs" % length)
+
+	# Convolution modulo each prime
+	residues = []
+	for (prime, root) in NTT_PRIMES:
+		if (use_numpy):
+			residues.append(_convolve_numpy(limbs1, limbs2, length, prime, root))
+		else:
+			residues.append(_convolve(limbs1, limbs2, length, prime, root))
+
+	# Garner: coefficient = x0 + p1*x1 + p1*p2*x2 with x0 < p1, x1 < p2, x2 < p3
+	((p1, _), (p2, _), (p3, _)) = NTT_PRIMES
+	p1_inverse_mod_p2 = pow(p1, p2 - 2, p2)
+	p1p2_inverse_mod_p3 = pow(p1 * p2 % p3, p3 - 2, p3)
+	(r1, r2, r3) = residues
+	if (use_numpy):
+		x0 = r1
+		x1 = (r2 - x0 % p2) % p2 * p1_inverse_mod_p2 % p2
+		x2 = (r3 - (x0 + p1 % p3 * x1) % p3) % p3 * p1p2_inverse_mod_p3 % p3
+	else:
+		x0 = r1
+		x1 = [(b - a) * p1_inverse_mod_p2 % p2 for (a, b) in zip(x0, r2)]
+		x2 = [(c - a - p1 * b) * p1p2_inverse_mod_p3 % p3 for (a, b, c) in zip(x0, x1, r3)]
+
+	# sum(coefficient_i * 2^(16*i)) for each Garner digit
+	result = _from_limb_values(x0) + p1 * _from_limb_values(x1) + p1 * p2 * _from_limb_values(x2)
+	return sign * result
+
+def _to_limbs(number):
+	limbs = array("H")
+	limbs.frombytes(number.to_bytes(((number.bit_length() + 15) // 16) * 2, "little"))
+	if (sys.byteorder == "big"):
+		limbs.byteswap()
+	return limbs
+
+def _from_limb_values(values):
+	"""
+	Returns sum(values[i] * 2^(16*i)) for values < 2^32
+	(the low and high 16 bits of the values are read as two numbers)
+	"""
+	if (numpy is not None and isinstance(values, numpy.ndarray)):
+		low = (values & 0xFFFF).astype("<u2").tobytes()
+		high = (values >> 16).astype("<u2").tobytes()
+		return int.from_bytes(low, "little") + (int.from_bytes(high, "little") << 16)
+	low = array("H", [value & 0xFFFF for value in values])
+	high = array("H", [value >> 16 for value in values])
+	if (sys.byteorder == "big"):
+		low.byteswap()
+		high.byteswap()
+	return int.from_bytes(low.tobytes(), "little") + (int.from_bytes(high.tobytes(), "little") << 16)
+
+def _convolve(limbs1, limbs2, length, prime, root):
+	a = _ntt(list(limbs1) + [0]*(length - len(limbs1)), prime, root, False)
+	b = _ntt(list(limbs2) + [0]*(length - len(limbs2)), prime, root, False)
+	return _ntt([x * y % prime for (x, y) in zip(a, b)], prime, root, True)
+
+def _ntt(values, prime, root, inverse):
+	"""
+	Iterative Cooley-Tukey number theoretic transform (length is a power of 2)
+	"""
+	n = len(values)
+	# Bit reversal permutation
+	j = 0
+	for i in range(1, n):
+		bit = n >> 1
+		while (j & bit):
+			j ^= bit
+			bit >>= 1
+		j |= bit
+		if (i < j):
+			values[i], values[j] = values[j], values[i]
+
+	length = 2
+	while (length <= n):
+		w_length = pow(root, (prime - 1) // length, prime)
+		if (inverse):
+			w_length = pow(w_length, prime - 2, prime)
+		half = length // 2
+		twiddles = [1]*half
+		for i in range(1, half):
+			twiddles[i] = twiddles[i - 1] * w_length % prime
+		for start in range(0, n, length):
+			for i in range(half):
+				u = values[start + i]
+				v = values[start + i + half] * twiddles[i] % prime
+				values[start + i] = (u + v) % prime
+				values[start + i + half] = (u - v) % prime
+		length <<= 1
+
+	if (inverse):
+		n_inverse = pow(n, prime - 2, prime)
+		values = [value * n_inverse % prime for value in values]
+	return values
+
+def _convolve_numpy(limbs1, limbs2, length, prime, root):
+	a = numpy.zeros(length, dtype=numpy.int64)
+	b = numpy.zeros(length, dtype=numpy.int64)
+	a[: len(limbs1)] = numpy.frombuffer(limbs1, dtype=numpy.uint16)
+	b[: len(limbs2)] = numpy.frombuffer(limbs2, dtype=numpy.uint16)
+	product = _ntt_numpy(a, prime, root, False) * _ntt_numpy(b, prime, root, False) % prime
+	return _ntt_numpy(product, prime, root, True)
+
+def _ntt_numpy(values, prime, root, inverse):
+	"""
+	Vectorized NTT: each stage transforms every block of the array at once.
+	Values are < 2^30, so the products fit in int64
+	"""
+	n = len(values)
+	bits = n.bit_length() - 1
+	indexes = numpy.arange(n)
+	reversed_indexes = numpy.zeros(n, dtype=numpy.int64)
+	for bit in range(bits):
+		reversed_indexes |= ((indexes >> bit) & 1) << (bits - 1 - bit)
+	values = values[reversed_indexes]
+
+	length = 2
+	while (length <= n):
+		w_length = pow(root, (prime - 1) // length, prime)
+		if (inverse):
+			w_length = pow(w_length, prime - 2, prime)
+		half = length // 2
+		# Powers of w_length by doubling
+		twiddles = numpy.ones(half, dtype=numpy.int64)
+		size = 1
+		while (size < half):
+			twiddles[size : 2*size] = twiddles[:size] * pow(w_length, size, prime) % prime
+			size *= 2
+		blocks = values.reshape(-1, length)
+		u = blocks[:, :half]
+		v = blocks[:, half:] * twiddles % prime
+		values = numpy.concatenate(((u + v) % prime, (u - v) % prime), axis=1).reshape(-1)
+		length <<= 1
+
+	if (inverse):
+		values = values * pow(n, prime - 2, prime) % prime
+	return values
+
+# Tests
+
+def run_tests():
+	print("Running tests...")
+	engines = [("toom3", lambda x, y: toom3_multiplication(x, y, cutoff_bits=64)),
+		("ntt", lambda x, y: ntt_multiplication(x, y, use_numpy=False)),
+		("multiply", multiply)]
+	if (numpy is not None):
+		engines.append(("ntt NumPy", lambda x, y: ntt_multiplication(x, y, use_numpy=True)))
+	for (name, engine) in engines:
+		passed = True
+		for _ in range(50):
+			number1 = random.getrandbits(random.randint(0, 20000)) * random.choice([1, -1])
+			number2 = random.getrandbits(random.randint(0, 20000)) * random.choice([1, -1])
+			if (engine(number1, number2) != number1 * number2):
+				passed = False
+				break
+		if (passed):
+			print("PASSED", name)
+		else:
+			print("--> FAILED", name, "-", number1, "*", number2)
+
+	# Worst case coefficients (every limb 0xFFFF)
+	number = (1 << (16 * 5000)) - 1
+	if (ntt_multiplication(number, number) == number * number):
+		print("PASSED ntt with all limbs 0xFFFF")
+	else:
+		print("--> FAILED ntt with all limbs 0xFFFF")
+
+	# Every engine of multiply, with the thresholds lowered
+	global KARATSUBA_THRESHOLD_BITS, TOOM3_THRESHOLD_BITS, NTT_THRESHOLD_BITS
+	thresholds = (KARATSUBA_THRESHOLD_BITS, TOOM3_THRESHOLD_BITS, NTT_THRESHOLD_BITS)
+	(KARATSUBA_THRESHOLD_BITS, TOOM3_THRESHOLD_BITS, NTT_THRESHOLD_BITS) = (1 << 10, 1 << 12, 1 << 14)
+	try:
+		passed = True
+		stats = Stats("multiply")
+		for bits in (500, 2000, 8000, 30000):
+			for _ in range(5):
+				number1 = random.getrandbits(bits) * random.choice([1, -1])
+				number2 = (random.getrandbits(bits) | (1 << (bits - 1))) * random.choice([1, -1])
+				if (multiply(number1, number2, stats) != number1 * number2):
+					passed = False
+		engines = sorted(stats.counters)
+	finally:
+		(KARATSUBA_THRESHOLD_BITS, TOOM3_THRESHOLD_BITS, NTT_THRESHOLD_BITS) = thresholds
+	if (passed and engines == ["karatsuba", "native", "ntt", "toom3"]):
+		print("PASSED multiply with lowered thresholds -", stats.counters)
+	else:
+		print("--> FAILED multiply with lowered thresholds -", stats.counters)
+
+	stats = Stats("toom3_multiplication")
+	number = (1 << (3 * 3 * 1000)) - 1
+	if (toom3_multiplication(number, number, stats, cutoff_bits=1000) == number * number and stats.depth == 0
+		and stats.counters["karatsuba_multiplications"] >= 25):
+		print("PASSED toom3 instrumentation - Calls:", stats.calls)
+	else:
+		print("--> FAILED toom3 instrumentation -", stats)
+
+def run_benchmark(max_bits = NTT_MAX_BITS):
+	"""
+	Time of each engine by operand size, and the size where each one starts to win
+	Run with: python large_multiplication.py benchmark
+
+	Goes up to the biggest NTT operands, so it takes several minutes. Engines that took
+	over a second and 4 times the fastest one aren't run at the bigger sizes ("-" in the table)
+	"""
+	print()
+	print("Benchmark - seconds by operand size")
+	engines = [("native", lambda x, y: x * y),
+		("karatsuba", binary_karatsuba_multiplication),
+		("toom3", toom3_multiplication),
+		("ntt", ntt_multiplication)]
+	print("%10s" % "bits" + "".join("%12s" % name for (name, _) in engines))
+	winners = []
+	dropped = set()
+	bits = 1 << 12
+	while (bits <= max_bits):
+		number1 = random.getrandbits(bits) | (1 << (bits - 1))
+		number2 = random.getrandbits(bits) | (1 << (bits - 1))
+		times = []
+		for (index, (name, engine)) in enumerate(engines):
+			if (index in dropped):
+				times.append(None)
+				continue
+			start = time.perf_counter()
+			engine(number1, number2)
+			times.append(time.perf_counter() - start)
+		print("%10d" % bits + "".join("%12s" % "-" if seconds is None else "%12.5f" % seconds for seconds in times))
+		fastest = min(seconds for seconds in times if seconds is not None)
+		winners.append((bits, engines[times.index(fastest)][0]))
+		dropped.update(index for (index, seconds) in enumerate(times) if seconds is not None and seconds > max(4 * fastest, 1))
+		bits <<= 1
+
+	print()
+	print("Thresholds: karatsuba %d, toom3 %d, ntt %d bits" % (KARATSUBA_THRESHOLD_BITS, TOOM3_THRESHOLD_BITS, NTT_THRESHOLD_BITS))
+	for i in range(len(winners)):
+		if (i == 0 or winners[i][1] != winners[i - 1][1]):
+			print("From %d bits: %s is the fastest" % winners[i])
+
+def main():
+	run_tests()
+	if ("benchmark" in sys.argv[1:]):
+		run_benchmark()
+
+# Runs code
+if __name__ == "__main__":
+	main()
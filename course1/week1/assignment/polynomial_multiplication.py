@@ -0,0 +1,330 @@
+"""
+    Author: Leonardo Ribeiro
+    Python Version: 3.8.10
+
+	Polynomial multiplication with Karatsuba
+
+	Same divide and conquer as karatsuba.py, on coefficient arrays (lowest degree
+	first) instead of digits:
+		(a0 + a1*x^h)(b0 + b1*x^h) = a0*b0 + ((a0 + a1)(b0 + b1) - a0*b0 - a1*b1)*x^h + a1*b1*x^2h
+
+	The recursion works on index ranges of the operands, the sums and the middle
+	product of every level live in one scratch buffer allocated up front, and
+	ranges up to a cutoff are multiplied with the schoolbook method.
+	Time complexity: O(n^1.585)
+
+	- array('q') operands are multiplied with Python integers (any size, the
+	result must fit in int64 when it's converted back)
+	- NumPy int64 operands are multiplied with vectorized operations
+	- modulus reduces the coefficients (e.g. polynomials over Z/pZ). NumPy operands
+	whose product may not fit in int64 (n*modulus^2 >= 2^63) use Python integers
+"""
+from array import array
+import random
+import sys
+import time
+
+# NumPy is optional, only used for NumPy operands
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# Ranges up to these sizes are multiplied with the schoolbook method
+SCHOOLBOOK_CUTOFF = 32
+NUMPY_SCHOOLBOOK_CUTOFF = 64
+
+INT64_LIMIT = 2**63
+
+def poly_multiply(a, b, modulus = None):
+	"""
+	Returns the coefficients of a*b, as array('q') (or as a NumPy array if
+	one of the operands is a NumPy array)
+	"""
+	return poly_multiply_many([(a, b)], modulus)[0]
+
+def poly_multiply_many(pairs, modulus = None):
+	"""
+	Multiplies many (a, b) pairs, reusing the same scratch buffer for all of them
+	"""
+	if (modulus is not None and modulus < 1):
+		raise Exception("modulus must be positive")
+	pairs = [(a, b) for (a, b) in pairs]
+	scratch_size = max([_buffer_size(len(a), len(b), NUMPY_SCHOOLBOOK_CUTOFF) for (a, b) in pairs], default=0)
+
+	python_scratch = None
+	numpy_scratch = None
+	results = []
+	for (a, b) in pairs:
+		if (numpy is not None and (isinstance(a, numpy.ndarray) or isinstance(b, numpy.ndarray))):
+			if (numpy_scratch is None):
+				numpy_scratch = numpy.zeros(scratch_size, dtype=numpy.int64)
+			results.append(_poly_multiply_numpy(a, b, modulus, numpy_scratch))
+		else:
+			if (python_scratch is None):
+				python_scratch = [0]*max([_buffer_size(len(a), len(b), SCHOOLBOOK_CUTOFF) for (a, b) in pairs])
+			results.append(array("q", _poly_multiply_list(list(a), list(b), modulus, python_scratch)))
+	return results
+
+def _scratch_size(n, cutoff):
+	"""
+	Scratch used by the Karatsuba recursion on ranges of size n:
+	the two sums and the middle product of each level
+	"""
+	size = 0
+	while (n > cutoff):
+		high = n - n // 2
+		size += 4*high - 1
+		n = high
+	return size
+
+def _buffer_size(length1, length2, cutoff):
+	"""
+	Block product + recursion scratch for operands of these lengths
+	"""
+	block = min(length1, length2)
+	if (block == 0):
+		return 0
+	return 2*block - 1 + _scratch_size(block, cutoff)
+
+def _blocks(long, short):
+	"""
+	The longer operand is multiplied in blocks of the size of the shorter one
+	"""
+	block = len(short)
+	padding = (-len(long)) % block
+	return (block, padding)
+
+# Python integers
+
+def _poly_multiply_list(a, b, modulus, scratch):
+	if (len(a) == 0 or len(b) == 0):
+		return []
+	if (modulus is not None):
+		a = [value % modulus for value in a]
+		b = [value % modulus for value in b]
+	if (len(a) < len(b)):
+		(a, b) = (b, a)
+
+	(block, padding) = _blocks(a, b)
+	a = a + [0]*padding
+	result = [0]*(len(a) + block - 1)
+	# The block product is the beginning of the scratch, the recursion uses the rest
+	for start in range(0, len(a), block):
+		_karatsuba(a, start, b, 0, block, scratch, 0, scratch, 2*block - 1, modulus)
+		for i in range(2*block - 1):
+			result[start + i] += scratch[i]
+		if (modulus is not None):
+			for i in range(start, start + 2*block - 1):
+				result[i] %= modulus
+	return result[: len(a) - padding + block - 1]
+
+def _karatsuba(a, a_start, b, b_start, n, out, out_start, scratch, scratch_start, modulus):
+	"""
+	Writes the product of a[a_start:a_start + n] and b[b_start:b_start + n]
+	to out[out_start:out_start + 2n - 1]
+	"""
+	# Base case
+	if (n <= SCHOOLBOOK_CUTOFF):
+		_schoolbook(a, a_start, b, b_start, n, out, out_start, modulus)
+		return
+
+	low = n // 2
+	high = n - low
+
+	# a0*b0 and a1*b1 go straight to their places in out
+	_karatsuba(a, a_start, b, b_start, low, out, out_start, scratch, scratch_start, modulus)
+	out[out_start + 2*low - 1] = 0
+	_karatsuba(a, a_start + low, b, b_start + low, high, out, out_start + 2*low, scratch, scratch_start, modulus)
+
+	# (a0 + a1)(b0 + b1) in the scratch
+	sum_a = scratch_start
+	sum_b = scratch_start + high
+	middle = scratch_start + 2*high
+	for i in range(high):
+		scratch[sum_a + i] = a[a_start + low + i]
+		scratch[sum_b + i] = b[b_start + low + i]
+	for i in range(low):
+		scratch[sum_a + i] += a[a_start + i]
+		scratch[sum_b + i] += b[b_start + i]
+	_karatsuba(scratch, sum_a, scratch, sum_b, high, scratch, middle, scratch, middle + 2*high - 1, modulus)
+
+	# Middle term: (a0 + a1)(b0 + b1) - a0*b0 - a1*b1
+	for i in range(2*low - 1):
+		scratch[middle + i] -= out[out_start + i]
+	for i in range(2*high - 1):
+		scratch[middle + i] -= out[out_start + 2*low + i]
+	for i in range(2*high - 1):
+		out[out_start + low + i] += scratch[middle + i]
+	if (modulus is not None):
+		for i in range(out_start + low, out_start + low + 2*high - 1):
+			out[i] %= modulus
+
+def _schoolbook(a, a_start, b, b_start, n, out, out_start, modulus):
+	for k in range(out_start, out_start + 2*n - 1):
+		out[k] = 0
+	b_range = b[b_start : b_start + n]
+	for i in range(n):
+		coefficient = a[a_start + i]
+		if (coefficient):
+			k = out_start + i
+			for b_coefficient in b_range:
+				out[k] += coefficient * b_coefficient
+				k += 1
+	if (modulus is not None):
+		for k in range(out_start, out_start + 2*n - 1):
+			out[k] %= modulus
+
+# NumPy
+
+def _poly_multiply_numpy(a, b, modulus, scratch):
+	"""
+	int64 arithmetic wraps around (it's exact modulo 2^64) and Karatsuba only adds,
+	subtracts and multiplies, so the result is exact whenever the final coefficients
+	fit in int64, even if intermediate sums overflow
+	"""
+	a = numpy.asarray(a, dtype=numpy.int64)
+	b = numpy.asarray(b, dtype=numpy.int64)
+	if (len(a) == 0 or len(b) == 0):
+		return numpy.zeros(0, dtype=numpy.int64)
+	if (modulus is not None):
+		if (modulus >= INT64_LIMIT):
+			return numpy.array(_poly_multiply_list_fallback(a, b, modulus), dtype=object)
+		a = a % modulus
+		b = b % modulus
+
+	bound = int(numpy.abs(a).max()) * int(numpy.abs(b).max()) * min(len(a), len(b))
+	if (bound >= INT64_LIMIT):
+		if (modulus is None):
+			raise OverflowError("Coefficients of the product may not fit in int64")
+		# Products of the reduced operands are still too big, Python integers
+		return numpy.array(_poly_multiply_list_fallback(a, b, modulus), dtype=numpy.int64)
+
+	if (len(a) < len(b)):
+		(a, b) = (b, a)
+	(block, padding) = _blocks(a, b)
+	if (padding):
+		a = numpy.concatenate((a, numpy.zeros(padding, dtype=numpy.int64)))
+	result = numpy.zeros(len(a) + block - 1, dtype=numpy.int64)
+	for start in range(0, len(a), block):
+		_karatsuba_numpy(a[start : start + block], b, scratch[: 2*block - 1], scratch[2*block - 1 :])
+		result[start : start + 2*block - 1] += scratch[: 2*block - 1]
+	result = result[: len(result) - padding]
+	if (modulus is not None):
+		result %= modulus
+	return result
+
+def _poly_multiply_list_fallback(a, b, modulus):
+	scratch = [0]*_buffer_size(len(a), len(b), SCHOOLBOOK_CUTOFF)
+	return _poly_multiply_list(a.tolist(), b.tolist(), modulus, scratch)
+
+def _karatsuba_numpy(a, b, out, scratch):
+	"""
+	Writes the product of the equal length arrays a and b to out (views, no copies)
+	"""
+	n = len(a)
+	# Base case
+	if (n <= NUMPY_SCHOOLBOOK_CUTOFF):
+		out[:] = numpy.convolve(a, b)
+		return
+
+	low = n // 2
+	high = n - low
+
+	_karatsuba_numpy(a[:low], b[:low], out[: 2*low - 1], scratch)
+	out[2*low - 1] = 0
+	_karatsuba_numpy(a[low:], b[low:], out[2*low :], scratch)
+
+	sum_a = scratch[:high]
+	sum_b = scratch[high : 2*high]
+	middle = scratch[2*high : 4*high - 1]
+	sum_a[:] = a[low:]
+	sum_a[:low] += a[:low]
+	sum_b[:] = b[low:]
+	sum_b[:low] += b[:low]
+	_karatsuba_numpy(sum_a, sum_b, middle, scratch[4*high - 1 :])
+
+	middle[: 2*low - 1] -= out[: 2*low - 1]
+	middle -= out[2*low :]
+	out[low : low + 2*high - 1] += middle
+
+# Tests
+
+def naive_multiply(a, b, modulus = None):
+	result = [0]*(len(a) + len(b) - 1) if (len(a) and len(b)) else []
+	for (i, x) in enumerate(a):
+		for (j, y) in enumerate(b):
+			result[i + j] += x * y
+	if (modulus is not None):
+		result = [value % modulus for value in result]
+	return result
+
+def run_tests():
+	print("Running tests...")
+	kinds = ["array"] + (["numpy"] if numpy is not None else [])
+	for kind in kinds:
+		passed = True
+		for _ in range(100):
+			bound = random.choice([1, 100, 10**6])
+			a = [random.randint(-bound, bound) for _ in range(random.randint(0, 400))]
+			b = [random.randint(-bound, bound) for _ in range(random.randint(0, 400))]
+			modulus = random.choice([None, 2, 998244353, 2**61 - 1])
+			if (kind == "numpy"):
+				result = poly_multiply(numpy.array(a, dtype=numpy.int64), numpy.array(b, dtype=numpy.int64), modulus).tolist()
+			else:
+				result = poly_multiply(array("q", a), array("q", b), modulus).tolist()
+			if (result != naive_multiply(a, b, modulus)):
+				passed = False
+				break
+		if (passed):
+			print("PASSED poly_multiply", kind)
+		else:
+			print("--> FAILED poly_multiply", kind, "- Lengths:", len(a), len(b), "Modulus:", modulus)
+
+	pairs = [(array("q", [random.randint(-9, 9) for _ in range(random.randint(1, 200))]),
+		array("q", [random.randint(-9, 9) for _ in range(random.randint(1, 200))])) for _ in range(20)]
+	results = poly_multiply_many(pairs, 17)
+	if (all(result.tolist() == naive_multiply(a.tolist(), b.tolist(), 17) for (result, (a, b)) in zip(results, pairs))):
+		print("PASSED poly_multiply_many")
+	else:
+		print("--> FAILED poly_multiply_many")
+
+	try:
+		poly_multiply(array("q", [2**40]*10), array("q", [2**40]*10))
+		print("--> FAILED poly_multiply overflow")
+	except OverflowError:
+		print("PASSED poly_multiply overflow")
+
+def run_benchmark(n = 4096, modulus = 65537):
+	"""
+	Run with: python polynomial_multiplication.py benchmark
+	"""
+	global SCHOOLBOOK_CUTOFF
+	print()
+	print("Benchmark - degree %d polynomials modulo %d" % (n - 1, modulus))
+	a = array("q", [random.randrange(modulus) for _ in range(n)])
+	b = array("q", [random.randrange(modulus) for _ in range(n)])
+	cutoff = SCHOOLBOOK_CUTOFF
+	engines = [("schoolbook", n), ("karatsuba", cutoff)]
+	for (name, engine_cutoff) in engines:
+		SCHOOLBOOK_CUTOFF = engine_cutoff
+		start = time.perf_counter()
+		poly_multiply(a, b, modulus)
+		print("%-17s %.3fs" % (name, time.perf_counter() - start))
+	SCHOOLBOOK_CUTOFF = cutoff
+	if (numpy is not None):
+		# n*modulus^2 < 2^63, so the product is computed with int64
+		a_numpy = numpy.frombuffer(a, dtype=numpy.int64)
+		b_numpy = numpy.frombuffer(b, dtype=numpy.int64)
+		start = time.perf_counter()
+		poly_multiply(a_numpy, b_numpy, modulus)
+		print("%-17s %.3fs" % ("karatsuba NumPy", time.perf_counter() - start))
+
+def main():
+	run_tests()
+	if ("benchmark" in sys.argv[1:]):
+		run_benchmark()
+
+# Runs code
+if __name__ == "__main__":
+	main()
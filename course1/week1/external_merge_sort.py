@@ -0,0 +1,224 @@
+"""
+    Author: Leonardo Ribeiro
+    Python Version: 3.8.10
+
+	External merge sort
+
+	Sorts integer files (one integer per line) that do not fit in memory.
+
+	1. The input is read in chunks that fit in the memory limit. Each chunk is
+	sorted with merge sort and written to a temporary run file.
+	2. The runs are merged with a heap based k-way merge, at most "fan_in" runs
+	at a time, until only one pass is left, which is streamed to the output file.
+
+	Running time: O(n*log(n)) comparisons, O(n*log_k(runs)) disk reads/writes
+"""
+from array import array
+from typing import Literal
+import heapq
+import os
+import random
+import tempfile
+
+from merge_sort import bottom_up_merge_sort
+
+# Type definitions
+RunFormat = Literal["text", "binary"]
+
+# Estimated bytes used by each number of a chunk while it is being sorted
+# (int object + list slot + merge sort auxiliary buffer slot)
+BYTES_PER_NUMBER = 48
+
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024 # 64 MB
+DEFAULT_FAN_IN = 64
+
+# Numbers read/written at once when streaming runs
+IO_BATCH_SIZE = 8192
+
+def main():
+	run_tests()
+	run_on_assignment_input()
+
+def external_merge_sort(
+	input_path,
+	output_path,
+	memory_limit = DEFAULT_MEMORY_LIMIT,
+	fan_in = DEFAULT_FAN_IN,
+	run_format: RunFormat = "binary",
+	temp_dir = None
+):
+	"""
+	Sorts the integers of input_path into output_path (both one integer per line)
+	Returns the number of integers sorted
+
+	memory_limit - approximate maximum number of bytes used by a chunk
+	fan_in - maximum number of runs merged at once
+	run_format - "binary" (int64) or "text" temporary run files
+	"""
+	if (fan_in < 2):
+		raise Exception("fan_in must be at least 2")
+	if (run_format not in ("text", "binary")):
+		raise Exception("Unknown run format: " + str(run_format))
+	chunk_size = max(1, memory_limit // BYTES_PER_NUMBER)
+
+	with tempfile.TemporaryDirectory(dir=temp_dir) as run_dir:
+		(runs, count) = create_sorted_runs(input_path, run_dir, chunk_size, run_format)
+
+		# Intermediate passes until the remaining runs can be merged at once
+		pass_number = 0
+		while (len(runs) > fan_in):
+			next_runs = []
+			for i in range(0, len(runs), fan_in):
+				group = runs[i : i + fan_in]
+				if (len(group) == 1):
+					next_runs.append(group[0])
+					continue
+				run_path = os.path.join(run_dir, "pass%d_run%d" % (pass_number, len(next_runs)))
+				merge_runs_to_file(group, run_path, run_format, run_format)
+				for path in group:
+					os.remove(path)
+				next_runs.append(run_path)
+			runs = next_runs
+			pass_number = pass_number + 1
+
+		merge_runs_to_file(runs, output_path, run_format, "text")
+
+	return count
+
+def create_sorted_runs(input_path, run_dir, chunk_size, run_format: RunFormat):
+	"""
+	Splits the input file in sorted run files of at most chunk_size numbers
+	Returns the run paths and the total count of numbers
+	"""
+	runs = []
+	count = 0
+	chunk = []
+	with open(input_path) as input_file:
+		for number in read_numbers(input_file, "text"):
+			chunk.append(number)
+			if (len(chunk) == chunk_size):
+				runs.append(write_run(bottom_up_merge_sort(chunk), run_dir, len(runs), run_format))
+				count = count + len(chunk)
+				chunk = []
+	if (len(chunk) > 0):
+		runs.append(write_run(bottom_up_merge_sort(chunk), run_dir, len(runs), run_format))
+		count = count + len(chunk)
+	return (runs, count)
+
+def write_run(sorted_chunk, run_dir, run_number, run_format: RunFormat):
+	"""
+	Writes a sorted chunk to a new run file and returns its path
+	"""
+	run_path = os.path.join(run_dir, "run%d" % run_number)
+	with open(run_path, "wb" if run_format == "binary" else "w") as run_file:
+		write_numbers(run_file, sorted_chunk, run_format)
+	return run_path
+
+def merge_runs_to_file(run_paths, output_path, run_format: RunFormat, output_format: RunFormat):
+	"""
+	Streams the k-way merge of the run files into output_path
+	"""
+	run_files = [open(path, "rb" if run_format == "binary" else "r") for path in run_paths]
+	try:
+		with open(output_path, "wb" if output_format == "binary" else "w") as output_file:
+			merged = heapq.merge(*[read_numbers(run_file, run_format) for run_file in run_files])
+			write_numbers(output_file, merged, output_format)
+	finally:
+		for run_file in run_files:
+			run_file.close()
+
+def read_numbers(file, file_format: RunFormat):
+	"""
+	Lazily reads the numbers of an opened file
+	"""
+	if (file_format == "binary"):
+		item_size = array("q").itemsize
+		while True:
+			data = file.read(IO_BATCH_SIZE * item_size)
+			if (not data):
+				return
+			yield from array("q", data)
+	else:
+		for line in file:
+			if (line.strip()):
+				yield int(line)
+
+def write_numbers(file, numbers, file_format: RunFormat):
+	"""
+	Writes an iterable of numbers to an opened file, in batches
+	"""
+	batch = []
+	for number in numbers:
+		batch.append(number)
+		if (len(batch) == IO_BATCH_SIZE):
+			_write_batch(file, batch, file_format)
+			batch = []
+	if (len(batch) > 0):
+		_write_batch(file, batch, file_format)
+
+def _write_batch(file, batch, file_format: RunFormat):
+	if (file_format == "binary"):
+		array("q", batch).tofile(file)
+	else:
+		file.write("\n".join(map(str, batch)))
+		file.write("\n")
+
+# Tests
+
+def test_external_merge_sort(numbers, memory_limit, fan_in, run_format: RunFormat):
+	"""
+	Sorts a temporary file with the given numbers and compares with sorted()
+	"""
+	with tempfile.TemporaryDirectory() as directory:
+		input_path = os.path.join(directory, "input.txt")
+		output_path = os.path.join(directory, "output.txt")
+		with open(input_path, "w") as input_file:
+			write_numbers(input_file, numbers, "text")
+
+		count = external_merge_sort(input_path, output_path, memory_limit, fan_in, run_format)
+		with open(output_path) as output_file:
+			result = list(read_numbers(output_file, "text"))
+
+	return (count == len(numbers) and result == sorted(numbers))
+
+def run_tests():
+	print("Running tests...")
+	passed = True
+	for _ in range(30):
+		numbers = [random.randint(-10**12, 10**12) for _ in range(random.randint(0, 3000))]
+		memory_limit = BYTES_PER_NUMBER * random.randint(1, 200)
+		fan_in = random.randint(2, 8)
+		for run_format in ("text", "binary"):
+			if (not test_external_merge_sort(numbers, memory_limit, fan_in, run_format)):
+				passed = False
+				print("--> FAILED external_merge_sort - Format:", run_format,
+					"Memory limit:", memory_limit, "Fan in:", fan_in)
+				break
+		if (not passed):
+			break
+	if (passed):
+		print("PASSED external_merge_sort")
+	print()
+
+def run_on_assignment_input():
+	"""
+	Sorts the week 2 assignment input with a small memory limit
+	"""
+	print("--- Running with week 2 assignment input... ---")
+	input_path = os.path.join(os.path.dirname(__file__), "..", "week2", "assignment", "_bcb5c6658381416d19b01bfc1d3993b5_IntegerArray.txt")
+	with tempfile.TemporaryDirectory() as directory:
+		output_path = os.path.join(directory, "output.txt")
+		count = external_merge_sort(input_path, output_path, memory_limit=BYTES_PER_NUMBER * 5000, fan_in=4)
+		with open(output_path) as output_file:
+			result = list(read_numbers(output_file, "text"))
+	with open(input_path) as input_file:
+		expected_result = sorted(read_numbers(input_file, "text"))
+
+	if (count == len(expected_result) and result == expected_result):
+		print("PASSED external_merge_sort with assignment input -", count, "numbers")
+	else:
+		print("--> FAILED external_merge_sort with assignment input")
+
+# Runs code
+if __name__ == "__main__":
+	main()
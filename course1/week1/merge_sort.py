@@ -5,8 +5,32 @@
 
 # For testing purposes
 import random
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Literal
+import os
+import sys
 
-def merge(A, B):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import course_paths
+from instrumentation import Stats
+from quick_sort import insertion_sort
+
+# Type definitions
+MergeSortMethod = Literal["top_down", "bottom_up", "parallel", "adaptive"]
+
+# Runs shorter than this are sorted with insertion sort before merging
+INSERTION_SORT_CUTOFF = 32
+
+# Lists shorter than this are sorted serially by the parallel method
+PARALLEL_THRESHOLD = 100000
+
+# Consecutive wins of one run before the adaptive merge starts galloping
+MIN_GALLOP = 7
+
+def merge(A, B, stats = None):
 	"""
 	Merge two sorted lists into one sorted list
 	"""
@@ -25,6 +49,11 @@ def merge(A, B):
 			j = j + 1
 		k = k + 1
 
+	# One comparison per element placed by the loop above
+	if (stats is not None):
+		stats.comparisons += k
+		stats.allocations += len(C)
+
 	"""
 	i and j are not zero at this point,
 	So the last two loops only execute for the remaining elements
@@ -41,15 +70,45 @@ def merge(A, B):
 		k = k + 1
 	return C
 
-def merge_sort(list):
+def merge_sort(list, method: MergeSortMethod = "bottom_up", workers = None, stats = None):
 	"""
 	Sorts a list of numbers
+
+	Returns a new sorted list, the input list is not modified
+	stats (instrumentation.Stats) is supported by the top_down and bottom_up methods
+	"""
+	if (stats is not None and method not in ("top_down", "bottom_up")):
+		raise Exception("Instrumentation is not supported by the " + str(method) + " method")
+
+	if (method == "top_down"):
+		return merge_sort_top_down(list, stats)
+	elif (method == "bottom_up"):
+		if (stats is not None):
+			stats.allocations += len(list)
+		return bottom_up_merge_sort([*list], stats=stats)
+	elif (method == "parallel"):
+		return parallel_merge_sort(list, workers)
+	elif (method == "adaptive"):
+		(result, _, _) = adaptive_merge_sort([*list])
+		return result
+	raise Exception("Unknown merge sort method: " + str(method))
+
+def merge_sort_top_down(list, stats = None):
+	"""
+	Recursive (top-down) merge sort
 	"""
 
 	 # Base case
 	if (len(list) <= 1):
+		if (stats is not None):
+			stats.enter()
+			stats.exit()
 		return list
 
+	if (stats is not None):
+		stats.enter()
+		stats.allocations += len(list)
+
 	middle = len(list) // 2
 
 	A = [0]*(middle)
@@ -60,12 +119,393 @@ def merge_sort(list):
 	for i in range(middle, len(list)):
 		B[i - len(list)] = list[i]
 
-	A = merge_sort(A)
-	B = merge_sort(B)
+	A = merge_sort_top_down(A, stats)
+	B = merge_sort_top_down(B, stats)
 
-	C = merge(A, B)
+	C = merge(A, B, stats)
+	if (stats is not None):
+		stats.exit()
 	return C
 
+def merge_runs(source, destination, start, middle, end, stats = None):
+	"""
+	Merges the sorted runs source[start:middle] and source[middle:end]
+	into destination[start:end]
+	"""
+	if (stats is not None):
+		stats.comparisons += 1
+
+	# Runs already in order, just copy them
+	if (source[middle - 1] <= source[middle]):
+		destination[start:end] = source[start:end]
+		return
+
+	i = start
+	j = middle
+	k = start
+	while (i < middle and j < end):
+		if (source[j] < source[i]):
+			destination[k] = source[j]
+			j = j + 1
+		else:
+			destination[k] = source[i]
+			i = i + 1
+		k = k + 1
+
+	# One comparison per element placed by the loop above
+	if (stats is not None):
+		stats.comparisons += k - start
+
+	# Only one of the runs still has elements at this point
+	if (i < middle):
+		destination[k:end] = source[i:middle]
+	else:
+		destination[k:end] = source[j:end]
+
+def bottom_up_merge_sort(list, cutoff = INSERTION_SORT_CUTOFF, stats = None):
+	"""
+	Iterative (bottom-up) merge sort. Sorts the list in place and returns it
+
+	Runs of size "cutoff" are insertion sorted first, then merged in passes of
+	doubling width, alternating between the list and a single auxiliary buffer.
+	So there is no recursion and only one extra list of size n is allocated.
+
+	Time complexity: O(n*log(n))
+	Space complexity: O(n)
+	"""
+	n = len(list)
+	cutoff = max(1, cutoff)
+
+	for start in range(0, n, cutoff):
+		insertion_sort(list, start, min(start + cutoff, n) - 1, stats)
+
+	source = list
+	destination = [0]*n
+	if (stats is not None):
+		stats.allocations += n
+
+	width = cutoff
+	while (width < n):
+		if (stats is not None):
+			stats.enter()
+			stats.exit()
+		for start in range(0, n, 2*width):
+			middle = min(start + width, n)
+			end = min(start + 2*width, n)
+			if (middle < end):
+				merge_runs(source, destination, start, middle, end, stats)
+			else:
+				# Trailing run without a pair on this pass
+				destination[start:end] = source[start:end]
+		source, destination = destination, source
+		width = 2*width
+
+	# Result ended up on the auxiliary buffer
+	if (source is not list):
+		list[:] = source
+	return list
+
+# Adaptive merge sort
+
+def gallop_left(key, list, start, end):
+	"""
+	First index of the sorted list[start:end] whose value is >= key
+
+	Exponential search from start (1, 2, 4, 8... positions ahead) followed by
+	a binary search, so it costs O(log(distance)) instead of O(log(end - start))
+	"""
+	last = 0
+	offset = 1
+	while (start + offset <= end and list[start + offset - 1] < key):
+		last = offset
+		offset = 2*offset
+	return bisect_left(list, key, start + last, min(start + offset, end))
+
+def gallop_right(key, list, start, end):
+	"""
+	First index of the sorted list[start:end] whose value is > key
+	(same exponential search as gallop_left)
+	"""
+	last = 0
+	offset = 1
+	while (start + offset <= end and list[start + offset - 1] <= key):
+		last = offset
+		offset = 2*offset
+	return bisect_right(list, key, start + last, min(start + offset, end))
+
+def min_run_length(n):
+	"""
+	Minimum run length so that n / min_run is a power of two (or slightly less),
+	which keeps the final merges balanced
+	"""
+	remainder = 0
+	while (n >= 2*INSERTION_SORT_CUTOFF):
+		remainder = remainder | (n & 1)
+		n = n >> 1
+	return n + remainder
+
+def count_run_and_make_ascending(list, start, end):
+	"""
+	Finds the natural run starting at start and returns where it ends.
+	Strictly descending runs are reversed in place (strict so that
+	reversing never changes the order of equal elements)
+	"""
+	run_end = start + 1
+	if (run_end == end):
+		return end
+
+	if (list[run_end] < list[start]):
+		while (run_end < end and list[run_end] < list[run_end - 1]):
+			run_end = run_end + 1
+		list[start:run_end] = list[start:run_end][::-1]
+	else:
+		while (run_end < end and list[run_end] >= list[run_end - 1]):
+			run_end = run_end + 1
+	return run_end
+
+def merge_with_gallop(list, start, middle, end):
+	"""
+	Merges the adjacent sorted runs list[start:middle] and list[middle:end] in place
+	Returns the number of times it switched to galloping
+
+	Elements already in their final position at the beginning of the left run
+	and at the end of the right run are skipped. When one run wins MIN_GALLOP
+	times in a row, the block of elements it still wins is found with a gallop
+	and copied at once with slice assignment
+	"""
+	gallops = 0
+	start = gallop_right(list[middle], list, start, middle)
+	if (start == middle):
+		return gallops
+	end = gallop_left(list[middle - 1], list, middle, end)
+
+	left = list[start:middle]
+	left_length = len(left)
+	i = 0
+	j = middle
+	k = start
+	left_wins = 0
+	right_wins = 0
+	while (i < left_length and j < end):
+		if (list[j] < left[i]):
+			list[k] = list[j]
+			j = j + 1
+			k = k + 1
+			right_wins = right_wins + 1
+			left_wins = 0
+			if (right_wins >= MIN_GALLOP):
+				stop = gallop_left(left[i], list, j, end)
+				list[k : k + stop - j] = list[j:stop]
+				k = k + stop - j
+				j = stop
+				right_wins = 0
+				gallops = gallops + 1
+		else:
+			list[k] = left[i]
+			i = i + 1
+			k = k + 1
+			left_wins = left_wins + 1
+			right_wins = 0
+			if (left_wins >= MIN_GALLOP):
+				stop = gallop_right(list[j], left, i, left_length)
+				list[k : k + stop - i] = left[i:stop]
+				k = k + stop - i
+				i = stop
+				left_wins = 0
+				gallops = gallops + 1
+
+	# Remaining right run elements are already in place
+	if (i < left_length):
+		list[k : k + left_length - i] = left[i:]
+	return gallops
+
+def adaptive_merge_sort(list):
+	"""
+	Natural merge sort (TimSort like). Sorts the list in place
+	Returns a tuple (list, natural runs found, gallops used)
+
+	Natural runs are detected (descending ones are reversed), short runs are
+	extended with insertion sort and the runs are merged while keeping the
+	stack invariants: len(A) > len(B) + len(C) and len(B) > len(C)
+	for the three topmost runs A, B, C. So merges stay balanced.
+
+	Time complexity: O(n*log(n)) / O(n) for sorted or almost sorted input
+	Space complexity: O(n)
+	"""
+	n = len(list)
+	min_run = min_run_length(n)
+	runs = 0
+	gallops = 0
+	stack = [] # (start, length) of the pending runs
+
+	start = 0
+	while (start < n):
+		end = count_run_and_make_ascending(list, start, n)
+		runs = runs + 1
+		if (end - start < min_run):
+			end = min(start + min_run, n)
+			insertion_sort(list, start, end - 1)
+		stack.append((start, end - start))
+		start = end
+
+		# Restores the invariants
+		while (len(stack) > 1):
+			i = len(stack) - 2
+			if ((i > 0 and stack[i - 1][1] <= stack[i][1] + stack[i + 1][1])
+				or (i > 1 and stack[i - 2][1] <= stack[i - 1][1] + stack[i][1])):
+				if (stack[i - 1][1] < stack[i + 1][1]):
+					i = i - 1
+			elif (stack[i][1] > stack[i + 1][1]):
+				break
+			gallops = gallops + _merge_stack_at(list, stack, i)
+
+	while (len(stack) > 1):
+		i = len(stack) - 2
+		if (i > 0 and stack[i - 1][1] < stack[i + 1][1]):
+			i = i - 1
+		gallops = gallops + _merge_stack_at(list, stack, i)
+
+	return (list, runs, gallops)
+
+def _merge_stack_at(list, stack, i):
+	"""
+	Merges the runs i and i + 1 of the stack
+	"""
+	(start, length) = stack[i]
+	(middle, next_length) = stack[i + 1]
+	stack[i] = (start, length + next_length)
+	del stack[i + 1]
+	return merge_with_gallop(list, start, middle, middle + next_length)
+
+# Parallel merge sort
+
+# Shared memory buffers attached by each worker process
+_worker_buffers = {}
+
+def _attach_worker_buffers(data_name, auxiliary_name):
+	"""
+	Process pool initializer. Attaches the shared int64 buffers once per worker
+	"""
+	for (key, name) in (("data", data_name), ("auxiliary", auxiliary_name)):
+		memory = shared_memory.SharedMemory(name=name)
+		_worker_buffers[key] = (memory, memory.buf.cast("q"))
+
+def _sort_shared_chunk(start, end):
+	"""
+	Sorts data[start:end] of the shared buffer
+	"""
+	view = _worker_buffers["data"][1]
+	chunk = bottom_up_merge_sort(view[start:end].tolist())
+	view[start:end] = array("q", chunk)
+
+def _merge_shared_segment(source_key, a_start, a_end, b_start, b_end, destination_start):
+	"""
+	Merges source[a_start:a_end] and source[b_start:b_end]
+	into the other shared buffer starting at destination_start
+	"""
+	source = _worker_buffers[source_key][1]
+	destination = _worker_buffers["auxiliary" if source_key == "data" else "data"][1]
+	middle = a_end - a_start
+	runs = source[a_start:a_end].tolist() + source[b_start:b_end].tolist()
+	merged = [0]*len(runs)
+	if (0 < middle < len(runs)):
+		merge_runs(runs, merged, 0, middle, len(runs))
+	else:
+		merged = runs
+	destination[destination_start : destination_start + len(merged)] = array("q", merged)
+
+def _co_rank(k, source, a_start, a_end, b_start, b_end):
+	"""
+	Number of elements taken from run A among the first k elements
+	of the merge of runs A = source[a_start:a_end] and B = source[b_start:b_end]
+	"""
+	a_length = a_end - a_start
+	low = max(0, k - (b_end - b_start))
+	high = min(k, a_length)
+	while (low < high):
+		i = (low + high) // 2
+		j = k - i
+		if (i < a_length and j > 0 and source[a_start + i] <= source[b_start + j - 1]):
+			low = i + 1
+		else:
+			high = i
+	return low
+
+def parallel_merge_sort(list, workers = None, threshold = PARALLEL_THRESHOLD):
+	"""
+	Multi process merge sort for int64 numbers. Returns a new sorted list
+
+	The numbers are copied once to a shared memory buffer. Each worker sorts
+	one chunk in place, then the sorted chunks are merged pairwise in rounds
+	between the buffer and a shared auxiliary buffer. Every merge is split in
+	independent output segments (found by binary search) so all workers
+	stay busy until the last round. No chunk is ever sent between processes.
+
+	Falls back to the serial bottom up merge sort below "threshold" elements
+	"""
+	n = len(list)
+	if (workers is None):
+		workers = os.cpu_count() or 1
+	if (n < max(threshold, 2) or workers <= 1):
+		return bottom_up_merge_sort([*list])
+
+	data = shared_memory.SharedMemory(create=True, size=n*8)
+	auxiliary = shared_memory.SharedMemory(create=True, size=n*8)
+	views = {"data": data.buf.cast("q"), "auxiliary": auxiliary.buf.cast("q")}
+	try:
+		views["data"][:] = array("q", list)
+
+		with ProcessPoolExecutor(
+			max_workers=workers,
+			initializer=_attach_worker_buffers,
+			initargs=(data.name, auxiliary.name)
+		) as executor:
+			chunk_size = -(-n // workers)
+			runs = [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+			for future in [executor.submit(_sort_shared_chunk, start, end) for (start, end) in runs]:
+				future.result()
+
+			source_key = "data"
+			while (len(runs) > 1):
+				source = views[source_key]
+				destination = views["auxiliary" if source_key == "data" else "data"]
+				segments_per_merge = max(1, workers // (len(runs) // 2))
+				futures = []
+				next_runs = []
+				for r in range(0, len(runs), 2):
+					if (r + 1 == len(runs)):
+						# Run without a pair on this round
+						(start, end) = runs[r]
+						destination[start:end] = source[start:end]
+						next_runs.append(runs[r])
+						continue
+					((a_start, a_end), (b_start, b_end)) = (runs[r], runs[r + 1])
+					length = b_end - a_start
+					ranks = [length * s // segments_per_merge for s in range(segments_per_merge + 1)]
+					splits = [_co_rank(k, source, a_start, a_end, b_start, b_end) for k in ranks]
+					for s in range(segments_per_merge):
+						(i_start, i_end) = (splits[s], splits[s + 1])
+						(j_start, j_end) = (ranks[s] - i_start, ranks[s + 1] - i_end)
+						futures.append(executor.submit(
+							_merge_shared_segment, source_key,
+							a_start + i_start, a_start + i_end,
+							b_start + j_start, b_start + j_end,
+							a_start + ranks[s]
+						))
+					next_runs.append((a_start, b_end))
+				for future in futures:
+					future.result()
+				runs = next_runs
+				source_key = "auxiliary" if source_key == "data" else "data"
+
+		return views[source_key].tolist()
+	finally:
+		for view in views.values():
+			view.release()
+		for memory in (data, auxiliary):
+			memory.close()
+			memory.unlink()
+
 def test_merge_only(A, B):
 	"""
 	Tests merge operation
@@ -88,10 +528,134 @@ def test_merge_sort(list):
 	else:
 		print("--> FAILED Merge Sort - Result: ", result, "  Expected: ", expected_result)
 
-# Running tests
+def test_merge_sort_methods():
+	"""
+	Tests top down and bottom up merge sort with random inputs
+	of different sizes, including duplicates and small cutoffs
+	"""
+	passed = True
+	for _ in range(100):
+		test_list = [random.randint(1, 500) for _ in range(random.randint(0, 1500))]
+		expected_result = sorted(test_list)
+		if (merge_sort(test_list, "top_down") != expected_result
+			or merge_sort(test_list, "bottom_up") != expected_result
+			or bottom_up_merge_sort(test_list[:], random.randint(1, 64)) != expected_result):
+			passed = False
+			break
+
+	# Any sequence is accepted, as before the methods were added
+	for method in ("top_down", "bottom_up", "parallel", "adaptive"):
+		if (merge_sort((3, 1, 2), method) != [1, 2, 3]):
+			passed = False
+	if (passed):
+		print("PASSED Merge Sort methods (top_down / bottom_up)")
+	else:
+		print("--> FAILED Merge Sort methods - Input: ", test_list)
+
+class CountedNumber:
+	"""
+	Number that counts every comparison made with it, to check the instrumentation
+	"""
+	comparisons = 0
+
+	def __init__(self, value):
+		self.value = value
+
+	def _compare(self, other, result):
+		CountedNumber.comparisons += 1
+		return result
+
+	def __lt__(self, other):
+		return self._compare(other, self.value < other.value)
+
+	def __le__(self, other):
+		return self._compare(other, self.value <= other.value)
+
+	def __gt__(self, other):
+		return self._compare(other, self.value > other.value)
+
+	def __ge__(self, other):
+		return self._compare(other, self.value >= other.value)
+
+def test_merge_sort_instrumentation():
+	"""
+	Checks the counted comparisons against the comparisons really made
+	"""
+	passed = True
+	for method in ("top_down", "bottom_up"):
+		test_list = [CountedNumber(random.randint(1, 300)) for _ in range(1000)]
+		stats = Stats(method)
+		CountedNumber.comparisons = 0
+		result = merge_sort(test_list, method, stats=stats)
+		if ([number.value for number in result] != sorted(number.value for number in test_list)
+			or stats.comparisons != CountedNumber.comparisons
+			or stats.allocations < len(test_list)
+			or stats.depth != 0):
+			passed = False
+			print("--> FAILED Merge Sort instrumentation -", stats, "Real comparisons:", CountedNumber.comparisons)
+	if (passed):
+		print("PASSED Merge Sort instrumentation")
+
+def test_adaptive_merge_sort():
+	"""
+	Tests the adaptive merge sort with random, nearly sorted
+	and reversed inputs and checks the reported runs
+	"""
+	passed = True
+	for _ in range(100):
+		n = random.randint(0, 3000)
+		test_list = [random.randint(1, random.choice([5, 10**6])) for _ in range(n)]
+		kind = random.choice(["random", "nearly_sorted", "sawtooth"])
+		if (kind == "nearly_sorted"):
+			test_list.sort()
+			for _ in range(5):
+				if (n > 0):
+					test_list[random.randrange(n)] = random.randint(1, 10**6)
+		elif (kind == "sawtooth"):
+			test_list = sorted(test_list[: n // 2]) + sorted(test_list[n // 2 :], reverse=True)
+		expected_result = sorted(test_list)
+		(result, _, _) = adaptive_merge_sort(test_list[:])
+		if (result != expected_result or merge_sort(test_list, "adaptive") != expected_result):
+			passed = False
+			break
+
+	(_, runs_sorted, gallops_sorted) = adaptive_merge_sort(list(range(10000)))
+	(_, runs_reversed, _) = adaptive_merge_sort(list(range(10000, 0, -1)))
+	if (runs_sorted != 1 or gallops_sorted != 0 or runs_reversed != 1):
+		passed = False
+	if (passed):
+		print("PASSED Adaptive Merge Sort")
+	else:
+		print("--> FAILED Adaptive Merge Sort - Input: ", test_list)
+
+def test_parallel_merge_sort():
+	"""
+	Tests the parallel merge sort with a low threshold so the
+	process pool is used even for small lists
+	"""
+	passed = True
+	for _ in range(5):
+		test_list = [random.randint(-10**12, 10**12) for _ in range(random.randint(2, 20000))]
+		workers = random.randint(2, 5)
+		if (parallel_merge_sort(test_list, workers, threshold=2) != sorted(test_list)):
+			passed = False
+			break
+	if (passed):
+		print("PASSED Parallel Merge Sort")
+	else:
+		print("--> FAILED Parallel Merge Sort - Workers: ", workers, " Input: ", test_list)
+
+def main():
+	test_merge_only([1,3,5], [2,4,9,11])
+	test_merge_only([1,3,5,22,22,102,106], [2,4,9,11,45,65,109,152])
 
-test_merge_only([1,3,5], [2,4,9,11])
-test_merge_only([1,3,5,22,22,102,106], [2,4,9,11,45,65,109,152])
+	test_merge_sort([1,3,5,22,22,102,106,2,4,9,11,45,65,109,152])
+	test_merge_sort(random.sample(range(1,200), 53))
+	test_merge_sort_methods()
+	test_merge_sort_instrumentation()
+	test_adaptive_merge_sort()
+	test_parallel_merge_sort()
 
-test_merge_sort([1,3,5,22,22,102,106,2,4,9,11,45,65,109,152])
-test_merge_sort(random.sample(range(1,200), 53))
+# Runs code
+if __name__ == "__main__":
+	main()
@@ -11,12 +11,42 @@
 	This is implementation is based on the merge sort algorithm.
 	With some slightly modifications is possible to calculate
 	the number of inversions on a list in O(n*log(n)) time (as in merge sort)
+
+	count_inversions counts without sorting, with a Fenwick tree (binary indexed tree)
+	over the ranks of the elements. Also O(n*log(n)), but with no list copies
 """
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import os
+import random
+import sys
+import time
+
+# NumPy is optional, only used by the vectorized path of count_inversions
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# Minimum list size to use the NumPy path when it's available
+NUMPY_THRESHOLD = 50000
+
+# Lists shorter than this are counted serially by parallel_count_inversions
+PARALLEL_THRESHOLD = 200000
+
+# Batches with fewer elements (rankings * ranking size) are compared serially by kendall_tau_many
+KENDALL_TAU_PARALLEL_THRESHOLD = 1000000
+
+# DynamicInversionCounter nodes covering up to this many positions are sorted lists
+SORTED_LIST_NODE_SIZE = 512
 
 def main():
 	run_tests()
 	run_on_assignment_input()
+	if ("benchmark" in sys.argv[1:]):
+		run_parallel_benchmark()
 
 def merge_and_count_split_inv(A, B):
 	"""
@@ -73,6 +103,574 @@ def sort_and_count_inv(list):
 	(C, count_split_inv) = merge_and_count_split_inv(A, B)
 	return (C, count_A + count_B + count_split_inv)
 
+def compress_coordinates(list):
+	"""
+	Maps each element to its rank (1 to number of distinct elements)
+	Returns a tuple (ranks as array('q'), number of distinct elements)
+	"""
+	rank_of = {value: rank for (rank, value) in enumerate(sorted(set(list)), 1)}
+	return (array("q", [rank_of[value] for value in list]), len(rank_of))
+
+def _fenwick_prefix(tree, i):
+	"""
+	Sum of the Fenwick tree positions 1 to i
+	"""
+	total = 0
+	while (i > 0):
+		total += tree[i]
+		i -= i & (-i)
+	return total
+
+def _fenwick_add(tree, i, size, amount = 1):
+	"""
+	Adds amount to position i of a Fenwick tree of positions 1 to size
+	"""
+	while (i <= size):
+		tree[i] += amount
+		i += i & (-i)
+
+def count_inversions(list, use_numpy = None):
+	"""
+	Counts inversions without sorting the list
+
+	Walking from left to right, the inversions of an element are the elements
+	already seen that are greater than it. A Fenwick tree indexed by rank keeps
+	how many of each rank were seen, so that is found in O(log(n))
+
+	use_numpy - None uses NumPy for big lists if it's installed
+
+	Time complexity: O(n*log(n))
+	Space complexity: O(n)
+	"""
+	if (use_numpy is None):
+		use_numpy = (numpy is not None and len(list) >= NUMPY_THRESHOLD)
+	if (use_numpy):
+		return _count_inversions_numpy(list)
+
+	(ranks, size) = compress_coordinates(list)
+	tree = array("q", bytes(8*(size + 1)))
+	inversions = 0
+	for (seen, rank) in enumerate(ranks):
+		# Seen elements greater than rank
+		inversions += seen - _fenwick_prefix(tree, rank)
+		_fenwick_add(tree, rank, size)
+	return inversions
+
+def _count_inversions_numpy(list):
+	"""
+	Vectorized bottom up merge count with NumPy
+
+	On each pass blocks of "width" elements are already sorted. For every
+	element of a right block, the greater elements of its left block are found
+	with a single searchsorted over all left blocks. Each pair of blocks is
+	offset by pair_index * size so the blocks never mix when sorted together
+
+	Time complexity: O(n*log^2(n)), but with no Python loop per element
+	"""
+	if (numpy is None):
+		raise Exception("NumPy is not installed")
+	values = numpy.asarray(list)
+	n = len(values)
+	if (n <= 1):
+		return 0
+	(distinct, ranks) = numpy.unique(values, return_inverse=True)
+	size = len(distinct)
+	blocks = ranks.astype(numpy.int64).reshape(-1)
+	indexes = numpy.arange(n, dtype=numpy.int64)
+
+	inversions = 0
+	width = 1
+	while (width < n):
+		pair = indexes // (2*width)
+		is_right = ((indexes // width) % 2) == 1
+		keys = blocks + pair*size
+		left_keys = keys[~is_right]
+		right_pair = pair[is_right]
+		# End of the left block of each right element, inside left_keys
+		left_end = (right_pair + 1)*width
+		not_greater = numpy.searchsorted(left_keys, keys[is_right], side="right")
+		inversions += int((left_end - not_greater).sum())
+		blocks = numpy.sort(keys, kind="stable") - pair*size
+		width = 2*width
+	return inversions
+
+# Shared buffer attached by each parallel_count_inversions worker process
+_worker_buffer = {}
+
+def _attach_worker_buffer(name):
+	"""
+	Process pool initializer. Attaches the shared int64 buffer once per worker
+	"""
+	memory = shared_memory.SharedMemory(name=name)
+	_worker_buffer["memory"] = memory
+	_worker_buffer["view"] = memory.buf.cast("q")
+
+def _count_and_sort_block(start, end):
+	"""
+	Counts the inversions of view[start:end] of the shared buffer, then sorts it there
+	"""
+	view = _worker_buffer["view"]
+	block = view[start:end].tolist()
+	inversions = count_inversions(block)
+	block.sort()
+	view[start:end] = array("q", block)
+	return inversions
+
+def _count_split_inversions(left_start, left_end, right_start, right_end):
+	"""
+	Pairs (x, y) with x in the left block, y in the right block and x > y,
+	both blocks already sorted in the shared buffer
+	"""
+	view = _worker_buffer["view"]
+	left = view[left_start:left_end].tolist()
+	right = view[right_start:right_end].tolist()
+	size = len(left)
+	inversions = 0
+	i = 0
+	for value in right:
+		# left[i:] are the left elements greater than value
+		i = bisect_right(left, value, i)
+		inversions += size - i
+	return inversions
+
+def parallel_count_inversions(list, workers = None, threshold = PARALLEL_THRESHOLD):
+	"""
+	Counts inversions using multiple processes
+
+	The numbers (or their ranks, if they aren't all int64) are copied once to a
+	shared memory buffer split in one contiguous block per worker:
+	1. Each worker counts the inversions inside a block and sorts it in the buffer
+	2. The split inversions are counted for every pair of blocks (earlier, later)
+	as independent tasks, each walking the two sorted blocks once
+
+	Only block indexes and counts are sent between processes. With w blocks the
+	pairs add O(n*w) work, spread evenly over the workers
+
+	Falls back to count_inversions below "threshold" elements
+	"""
+	n = len(list)
+	if (workers is None):
+		workers = os.cpu_count() or 1
+	if (n < max(threshold, 2) or workers <= 1):
+		return count_inversions(list)
+
+	if (all(type(value) is int and -2**63 <= value < 2**63 for value in list)):
+		values = array("q", list)
+	else:
+		(values, _) = compress_coordinates(list)
+
+	memory = shared_memory.SharedMemory(create=True, size=n*8)
+	view = memory.buf.cast("q")
+	try:
+		view[:] = values
+		block_size = -(-n // workers)
+		blocks = [(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+		pairs = [blocks[i] + blocks[j] for i in range(len(blocks)) for j in range(i + 1, len(blocks))]
+
+		with ProcessPoolExecutor(
+			max_workers=workers,
+			initializer=_attach_worker_buffer,
+			initargs=(memory.name,)
+		) as executor:
+			inversions = sum(executor.map(_count_and_sort_block, *zip(*blocks)))
+			if (pairs):
+				inversions += sum(executor.map(_count_split_inversions, *zip(*pairs)))
+	finally:
+		view.release()
+		memory.close()
+		memory.unlink()
+	return inversions
+
+# Reference ranks of the kendall_tau_many worker processes
+_worker_rank_of = None
+
+def _set_worker_reference(reference):
+	"""
+	Process pool initializer. Builds the reference rank map once per worker
+	"""
+	global _worker_rank_of
+	_worker_rank_of = _reference_ranks(reference)
+
+def _reference_ranks(reference):
+	return {item: rank for (rank, item) in enumerate(reference, 1)}
+
+def _kendall_tau_distances(rank_of, rankings):
+	"""
+	Inversions of each ranking after relabeling its items with their
+	reference ranks. One Fenwick tree is allocated and reset for every ranking
+	"""
+	n = len(rank_of)
+	tree = array("q", bytes(8*(n + 1)))
+	zeros = array("q", bytes(8*(n + 1)))
+	distances = array("q")
+	for ranking in rankings:
+		if (len(ranking) != n):
+			raise Exception("Ranking size differs from the reference size")
+		tree[:] = zeros
+		inversions = 0
+		for (seen, item) in enumerate(ranking):
+			rank = rank_of[item]
+			inversions += seen - _fenwick_prefix(tree, rank)
+			_fenwick_add(tree, rank, n)
+		distances.append(inversions)
+	return distances
+
+def _kendall_tau_worker_distances(rankings):
+	return _kendall_tau_distances(_worker_rank_of, rankings)
+
+def kendall_tau_many(reference, rankings, workers = None, threshold = KENDALL_TAU_PARALLEL_THRESHOLD):
+	"""
+	Compares many rankings (orderings of the same distinct items) against a reference ranking
+
+	Returns a tuple (distances as array('q'), tau coefficients as array('d'))
+	The distance is the number of discordant pairs (inversions after relabeling
+	each item with its reference rank) and tau = 1 - 4*distance / (n*(n - 1))
+
+	Batches with at least "threshold" elements are split among a process pool
+	"""
+	rankings = [*rankings]
+	n = len(reference)
+	if (workers is None):
+		workers = os.cpu_count() or 1
+
+	if (workers <= 1 or len(rankings) < 2 or len(rankings)*n < threshold):
+		distances = _kendall_tau_distances(_reference_ranks(reference), rankings)
+	else:
+		batch_size = -(-len(rankings) // (4*workers))
+		batches = [rankings[start : start + batch_size] for start in range(0, len(rankings), batch_size)]
+		distances = array("q")
+		with ProcessPoolExecutor(
+			max_workers=workers,
+			initializer=_set_worker_reference,
+			initargs=(reference,)
+		) as executor:
+			for batch_distances in executor.map(_kendall_tau_worker_distances, batches):
+				distances.extend(batch_distances)
+
+	pairs = n*(n - 1) // 2
+	taus = array("d", [1 - 2*distance / pairs if pairs > 0 else 1.0 for distance in distances])
+	return (distances, taus)
+
+class OnlineInversionCounter:
+	"""
+	Counts inversions of a stream, one element at a time
+
+	The possible values must be known up front (for example range(1, n + 1)),
+	so the Fenwick tree can be allocated once. Memory is O(number of possible values)
+	and doesn't grow with the stream
+	"""
+
+	def __init__(self, domain):
+		if (isinstance(domain, range) and domain.step == 1):
+			self._offset = domain.start - 1
+			self._rank_of = None
+			self._size = len(domain)
+		else:
+			self._rank_of = {value: rank for (rank, value) in enumerate(sorted(set(domain)), 1)}
+			self._size = len(self._rank_of)
+		self._tree = array("q", bytes(8*(self._size + 1)))
+		self.count = 0
+		self.inversions = 0
+
+	def _rank(self, value):
+		if (self._rank_of is not None):
+			if (value not in self._rank_of):
+				raise Exception("Value out of the counter domain: " + str(value))
+			return self._rank_of[value]
+		rank = value - self._offset
+		if (rank < 1 or rank > self._size):
+			raise Exception("Value out of the counter domain: " + str(value))
+		return rank
+
+	def add(self, value):
+		"""
+		Adds the next element of the stream and returns the running inversion count
+		"""
+		rank = self._rank(value)
+		self.inversions += self.count - _fenwick_prefix(self._tree, rank)
+		_fenwick_add(self._tree, rank, self._size)
+		self.count += 1
+		return self.inversions
+
+class _TreapForest:
+	"""
+	Many treaps (balanced binary search trees with random priorities) sharing
+	one pool of nodes. Each treap is a multiset of values, identified by its root
+	node, with O(log(n)) expected insert, remove and "how many are less/greater" queries
+
+	Nodes are indexes into parallel lists, node 0 is the empty tree
+	"""
+
+	def __init__(self):
+		self.key = [None]
+		self.priority = [0.0]
+		self.left = [0]
+		self.right = [0]
+		self.size = [0]
+		self._free = []
+
+	def _new_node(self, key):
+		if (self._free):
+			node = self._free.pop()
+			self.key[node] = key
+			self.priority[node] = random.random()
+			self.left[node] = self.right[node] = 0
+			self.size[node] = 1
+			return node
+		self.key.append(key)
+		self.priority.append(random.random())
+		self.left.append(0)
+		self.right.append(0)
+		self.size.append(1)
+		return len(self.key) - 1
+
+	def _split(self, node, key):
+		"""
+		Splits a treap in (values less than key, values not less than key)
+		"""
+		if (node == 0):
+			return (0, 0)
+		size = self.size
+		if (self.key[node] < key):
+			(less, not_less) = self._split(self.right[node], key)
+			self.right[node] = less
+			size[node] = size[self.left[node]] + size[less] + 1
+			return (node, not_less)
+		(less, not_less) = self._split(self.left[node], key)
+		self.left[node] = not_less
+		size[node] = size[not_less] + size[self.right[node]] + 1
+		return (less, node)
+
+	def _merge(self, first, second):
+		"""
+		Joins two treaps where every value of first is not greater than the values of second
+		"""
+		if (first == 0):
+			return second
+		if (second == 0):
+			return first
+		size = self.size
+		if (self.priority[first] > self.priority[second]):
+			self.right[first] = self._merge(self.right[first], second)
+			size[first] = size[self.left[first]] + size[self.right[first]] + 1
+			return first
+		self.left[second] = self._merge(first, self.left[second])
+		size[second] = size[self.left[second]] + size[self.right[second]] + 1
+		return second
+
+	def insert(self, root, key):
+		"""
+		Adds key to the treap and returns its new root
+		"""
+		return self._insert(root, self._new_node(key))
+
+	def _insert(self, root, node):
+		if (root == 0):
+			return node
+		if (self.priority[node] > self.priority[root]):
+			self.size[node] = self.size[root] + 1
+			(self.left[node], self.right[node]) = self._split(root, self.key[node])
+			return node
+		self.size[root] += 1
+		if (self.key[node] < self.key[root]):
+			self.left[root] = self._insert(self.left[root], node)
+		else:
+			self.right[root] = self._insert(self.right[root], node)
+		return root
+
+	def remove(self, root, key):
+		"""
+		Removes one occurrence of key (that must be in the treap) and returns the new root
+		"""
+		node_key = self.key[root]
+		if (key < node_key):
+			self.left[root] = self.remove(self.left[root], key)
+		elif (node_key < key):
+			self.right[root] = self.remove(self.right[root], key)
+		else:
+			self._free.append(root)
+			self.key[root] = None
+			return self._merge(self.left[root], self.right[root])
+		self.size[root] -= 1
+		return root
+
+	def count_less(self, root, key):
+		count = 0
+		node = root
+		while (node):
+			if (self.key[node] < key):
+				count += self.size[self.left[node]] + 1
+				node = self.right[node]
+			else:
+				node = self.left[node]
+		return count
+
+	def count_greater(self, root, key):
+		count = 0
+		node = root
+		while (node):
+			if (key < self.key[node]):
+				count += self.size[self.right[node]] + 1
+				node = self.left[node]
+			else:
+				node = self.right[node]
+		return count
+
+class DynamicInversionCounter:
+	"""
+	Keeps the inversion count of a sequence that changes by appending
+	to the right, removing from the left and updating elements
+
+	Uses a Fenwick tree over the positions where every node keeps the values
+	of the positions it covers in a treap (or, for nodes covering at most
+	SORTED_LIST_NODE_SIZE positions, in a sorted list, whose insertions are
+	bounded by that size). So "how many elements before position p
+	are greater (or less) than v" visits O(log(n)) nodes with one O(log(n)) treap
+	query each, and an insertion or removal touches O(log(n)) treaps.
+	Time complexity: O(log^2(n)) expected per operation
+	Space complexity: O(n*log(n))
+
+	Positions only grow (appends), so the tree is rebuilt with the current
+	elements when it runs out of positions, amortized O(log^2(n)) per append
+	"""
+
+	def __init__(self, values = ()):
+		self._values = [] # Value by position, None for removed positions
+		self._first = 0 # Position of the first element
+		self.inversions = 0
+		self._rebuild(8)
+		for value in values:
+			self.append(value)
+
+	def __len__(self):
+		return len(self._values) - self._first
+
+	def __getitem__(self, index):
+		if (index < 0 or index >= len(self)):
+			raise IndexError("Index out of range")
+		return self._values[self._first + index]
+
+	def _rebuild(self, minimum_size):
+		"""
+		Creates a new tree with room for twice the current elements
+		"""
+		self._values = self._values[self._first :]
+		self._first = 0
+		self._size = max(minimum_size, 2*len(self._values))
+		self._treaps = _TreapForest()
+		self._roots = [[] if (i & (-i)) <= SORTED_LIST_NODE_SIZE else 0 for i in range(self._size + 1)]
+		for (position, value) in enumerate(self._values):
+			self._insert(position, value)
+
+	def _insert(self, position, value):
+		i = position + 1
+		while (i <= self._size):
+			if ((i & (-i)) <= SORTED_LIST_NODE_SIZE):
+				insort(self._roots[i], value)
+			else:
+				self._roots[i] = self._treaps.insert(self._roots[i], value)
+			i += i & (-i)
+
+	def _remove(self, position, value):
+		i = position + 1
+		while (i <= self._size):
+			if ((i & (-i)) <= SORTED_LIST_NODE_SIZE):
+				node = self._roots[i]
+				del node[bisect_left(node, value)]
+			else:
+				self._roots[i] = self._treaps.remove(self._roots[i], value)
+			i += i & (-i)
+
+	def _count_less(self, end, value):
+		"""
+		Elements in positions before end with value less than "value"
+		"""
+		count = 0
+		i = end
+		while (i > 0):
+			if ((i & (-i)) <= SORTED_LIST_NODE_SIZE):
+				count += bisect_left(self._roots[i], value)
+			else:
+				count += self._treaps.count_less(self._roots[i], value)
+			i -= i & (-i)
+		return count
+
+	def _count_greater(self, end, value):
+		"""
+		Elements in positions before end with value greater than "value"
+		"""
+		count = 0
+		i = end
+		while (i > 0):
+			if ((i & (-i)) <= SORTED_LIST_NODE_SIZE):
+				node = self._roots[i]
+				count += len(node) - bisect_right(node, value)
+			else:
+				count += self._treaps.count_greater(self._roots[i], value)
+			i -= i & (-i)
+		return count
+
+	def _inversions_of(self, position, value):
+		"""
+		Inversions between "value" at position and all the other elements
+		"""
+		end = len(self._values)
+		return (self._count_greater(position, value)
+			+ self._count_less(end, value) - self._count_less(position + 1, value))
+
+	def append(self, value):
+		"""
+		Adds value at the end and returns the inversion count
+		"""
+		if (len(self._values) == self._size):
+			self._rebuild(8)
+		position = len(self._values)
+		self.inversions += self._count_greater(position, value)
+		self._values.append(value)
+		self._insert(position, value)
+		return self.inversions
+
+	def pop_left(self):
+		"""
+		Removes and returns the first element
+		"""
+		if (len(self) == 0):
+			raise IndexError("pop_left from an empty counter")
+		position = self._first
+		value = self._values[position]
+		self.inversions -= self._count_less(len(self._values), value)
+		self._remove(position, value)
+		self._values[position] = None
+		self._first += 1
+		return value
+
+	def update(self, index, value):
+		"""
+		Replaces the element at index (0 is the first element) and returns the inversion count
+		"""
+		if (index < 0 or index >= len(self)):
+			raise IndexError("Index out of range")
+		position = self._first + index
+		old_value = self._values[position]
+		self.inversions -= self._inversions_of(position, old_value)
+		self._remove(position, old_value)
+		self._values[position] = value
+		self._insert(position, value)
+		self.inversions += self._inversions_of(position, value)
+		return self.inversions
+
+def sliding_window_inversions(stream, window_size):
+	"""
+	Yields the inversion count of every full window of window_size elements of the stream
+	"""
+	counter = DynamicInversionCounter()
+	for value in stream:
+		counter.append(value)
+		if (len(counter) > window_size):
+			counter.pop_left()
+		if (len(counter) == window_size):
+			yield counter.inversions
+
 # Testing algorithm for known results
 
 def test_sort_and_count_inv(list, expected_count):
@@ -82,6 +680,112 @@ def test_sort_and_count_inv(list, expected_count):
 	else:
 		print("--> FAILED sort_and_count_inv - Inversions:", count, "Expected: ", expected_count)
 
+def test_count_inversions(list, expected_count):
+	counts = [count_inversions(list, use_numpy=False)]
+	if (numpy is not None):
+		counts.append(count_inversions(list, use_numpy=True))
+	counter = OnlineInversionCounter(list)
+	for value in list:
+		counter.add(value)
+	counts.append(counter.inversions)
+	if (all(count == expected_count for count in counts)):
+		print("PASSED count_inversions - Inversions:", expected_count)
+	else:
+		print("--> FAILED count_inversions - Inversions:", counts, "Expected: ", expected_count)
+
+def test_count_inversions_random():
+	passed = True
+	for _ in range(100):
+		test_list = [random.randint(1, random.choice([3, 1000])) for _ in range(random.randint(0, 500))]
+		(_, expected_count) = sort_and_count_inv(test_list)
+		counter = OnlineInversionCounter(range(1, 1001))
+		running = [counter.add(value) for value in test_list]
+		expected_running = [sort_and_count_inv(test_list[: i + 1])[1] for i in range(0, len(test_list), 50)]
+		if (count_inversions(test_list, use_numpy=False) != expected_count
+			or (numpy is not None and count_inversions(test_list, use_numpy=True) != expected_count)
+			or running[::50] != expected_running):
+			passed = False
+			break
+	if (passed):
+		print("PASSED count_inversions with random inputs")
+	else:
+		print("--> FAILED count_inversions with input:", test_list)
+
+def test_parallel_count_inversions():
+	passed = True
+	for _ in range(5):
+		test_list = [random.randint(-1000, 1000) for _ in range(random.randint(0, 5000))]
+		if (random.random() < 0.5):
+			# Not int64, counted on the ranks
+			test_list = [value / 7 if value % 2 else 2**70 + value for value in test_list]
+		(_, expected_count) = sort_and_count_inv(test_list)
+		workers = random.randint(2, 5)
+		if (parallel_count_inversions(test_list, workers, threshold=0) != expected_count):
+			passed = False
+			break
+	if (passed):
+		print("PASSED parallel_count_inversions")
+	else:
+		print("--> FAILED parallel_count_inversions - Workers:", workers, "Input:", test_list)
+
+def test_dynamic_inversion_counter():
+	global SORTED_LIST_NODE_SIZE
+	list_node_size = SORTED_LIST_NODE_SIZE
+	# Only treaps, then the default mix of sorted lists and treaps
+	for SORTED_LIST_NODE_SIZE in (0, list_node_size):
+		_test_dynamic_inversion_counter()
+	SORTED_LIST_NODE_SIZE = list_node_size
+
+def _test_dynamic_inversion_counter():
+	passed = True
+	counter = DynamicInversionCounter()
+	window = []
+	for operation_number in range(3000):
+		operation = random.choice(["append", "append", "pop_left", "update"])
+		value = random.randint(1, 50)
+		if (operation == "append"):
+			counter.append(value)
+			window.append(value)
+		elif (operation == "pop_left" and len(window) > 0):
+			if (counter.pop_left() != window.pop(0)):
+				passed = False
+		elif (operation == "update" and len(window) > 0):
+			index = random.randrange(len(window))
+			counter.update(index, value)
+			window[index] = value
+		(_, expected_count) = sort_and_count_inv(window)
+		if (not passed or counter.inversions != expected_count or len(counter) != len(window)):
+			passed = False
+			break
+
+	stream = [random.randint(1, 100) for _ in range(300)]
+	expected_windows = [sort_and_count_inv(stream[i : i + 20])[1] for i in range(len(stream) - 19)]
+	if ([*sliding_window_inversions(stream, 20)] != expected_windows):
+		passed = False
+
+	if (passed):
+		print("PASSED DynamicInversionCounter - Sorted list nodes up to", SORTED_LIST_NODE_SIZE)
+	else:
+		print("--> FAILED DynamicInversionCounter - Operation:", operation_number, "Window:", window)
+
+def test_kendall_tau_many():
+	passed = True
+	reference = random.sample(range(10000), 300)
+	position = {item: index for (index, item) in enumerate(reference)}
+	rankings = [random.sample(reference, len(reference)) for _ in range(20)]
+	rankings.append(reference[:])
+	rankings.append(reference[::-1])
+	expected_distances = [sort_and_count_inv([position[item] for item in ranking])[1] for ranking in rankings]
+
+	for (workers, threshold) in ((1, KENDALL_TAU_PARALLEL_THRESHOLD), (3, 0)):
+		(distances, taus) = kendall_tau_many(reference, rankings, workers, threshold)
+		if ([*distances] != expected_distances or taus[-2] != 1.0 or taus[-1] != -1.0):
+			passed = False
+	if (passed):
+		print("PASSED kendall_tau_many")
+	else:
+		print("--> FAILED kendall_tau_many - Distances:", [*distances], "Expected:", expected_distances)
+
 def run_tests():
 	print("Tests")
 	test_sort_and_count_inv([], 0)
@@ -92,6 +796,16 @@ def run_tests():
 	test_sort_and_count_inv([1,2,3,1,2], 3)
 	test_sort_and_count_inv([22,16,15,7,2,1], 15)
 	test_sort_and_count_inv([1, 20, 6, 4, 5], 5)
+	test_count_inversions([], 0)
+	test_count_inversions([1], 0)
+	test_count_inversions([2, 4, 1, 3, 5], 3)
+	test_count_inversions([10, 10, 10], 0)
+	test_count_inversions([1,2,3,1,2], 3)
+	test_count_inversions([22,16,15,7,2,1], 15)
+	test_count_inversions_random()
+	test_parallel_count_inversions()
+	test_dynamic_inversion_counter()
+	test_kendall_tau_many()
 	print()
 
 def run_on_assignment_input():
@@ -101,9 +815,34 @@ def run_on_assignment_input():
 	with open(filepath) as file:
 		list = [int(line) for line in file]
 
-	(_, inversions) = sort_and_count_inv(list)
+	inversions = count_inversions(list)
 	print("Inversions on assignment list:", inversions)
 
+def run_parallel_benchmark(n = 2000000):
+	"""
+	Compares serial and parallel counting on a random permutation
+	Run with: python count_inversions.py benchmark
+	"""
+	print()
+	print("Benchmark - random permutation of", n, "elements,", os.cpu_count(), "cores")
+	permutation = random.sample(range(1, n + 1), n)
+
+	start = time.perf_counter()
+	serial_inversions = count_inversions(permutation)
+	serial_time = time.perf_counter() - start
+	print("count_inversions:          %.2fs" % serial_time)
+
+	start = time.perf_counter()
+	workers = max(2, os.cpu_count() or 1)
+	parallel_inversions = parallel_count_inversions(permutation, workers, threshold=0)
+	parallel_time = time.perf_counter() - start
+	print("parallel_count_inversions: %.2fs (%d workers)" % (parallel_time, workers))
+
+	if (serial_inversions == parallel_inversions):
+		print("PASSED - Same count:", serial_inversions, "- Speedup: %.2fx" % (serial_time / parallel_time))
+	else:
+		print("--> FAILED - Serial:", serial_inversions, "Parallel:", parallel_inversions)
+
 # Runs code
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,13 +4,19 @@
 """
 
 import math
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import course_paths
+from instrumentation import Stats
 
 def main():
 	run_tests_basic_operations()
 	run_multiplication_tests()
 
 
-def _strassen(a, b):
+def _strassen(a, b, stats = None):
 	"""
 	Strassen's Algorithm for matrix multiplication
 
@@ -21,27 +27,36 @@ def _strassen(a, b):
 
 	# Base case - 1x1 matrices being multiplied
 	if (len(a[0]) == 1):
+		if (stats is not None):
+			stats.enter()
+			stats.count("scalar_multiplications")
+			stats.exit()
 		return [[a[0][0]*b[0][0]]]
 
+	if (stats is not None):
+		stats.enter()
+
 	[a11, a12, a21, a22] = split(a)
 	[b11, b12, b21, b22] = split(b)
 
-	p1 = _strassen(add(a11, a22), add(b11, b22))
-	p2 = _strassen(add(a21, a22), b11)
-	p3 = _strassen(a11, subtract(b12, b22))
-	p4 = _strassen(a22, subtract(b21, b11))
-	p5 = _strassen(add(a11, a12), b22)
-	p6 = _strassen(subtract(a21, a11), add(b11, b12))
-	p7 = _strassen(subtract(a12, a22), add(b21, b22))
+	p1 = _strassen(add(a11, a22), add(b11, b22), stats)
+	p2 = _strassen(add(a21, a22), b11, stats)
+	p3 = _strassen(a11, subtract(b12, b22), stats)
+	p4 = _strassen(a22, subtract(b21, b11), stats)
+	p5 = _strassen(add(a11, a12), b22, stats)
+	p6 = _strassen(subtract(a21, a11), add(b11, b12), stats)
+	p7 = _strassen(subtract(a12, a22), add(b21, b22), stats)
 
 	q11 = add(add(p1, p4), subtract(p7, p5))
 	q12 = add(p3, p5)
 	q21 = add(p2, p4)
 	q22 = add(subtract(p1, p2), add(p3, p6))
 
+	if (stats is not None):
+		stats.exit()
 	return join_quadrants(q11, q12, q21, q22)
 
-def strassen(a, b):
+def strassen(a, b, stats = None):
 	"""
 	Wrapper around Strassen algorithm implementation to validate inputs
 	before starting
@@ -51,7 +66,7 @@ def strassen(a, b):
 		raise Exception("Matrices cannot be multiplied")
 	validate_is_power_of_two(n)
 
-	return _strassen(a,b)
+	return _strassen(a, b, stats)
 
 
 # Basic operations
@@ -146,8 +161,11 @@ def print_matrix(m):
 # Tests for matrix multiplication
 
 def test_strassen_multiply(a, b, expected):
-	result = strassen(a, b)
-	if (result == expected):
+	stats = Stats("strassen")
+	result = strassen(a, b, stats)
+	# 7 multiplications per level instead of 8
+	expected_multiplications = 7 ** int(math.log2(len(a)))
+	if (result == expected and stats.counters["scalar_multiplications"] == expected_multiplications):
 		print("PASSED strassen - Result:")
 		print_matrix(result)
 	else:
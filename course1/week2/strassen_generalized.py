@@ -9,7 +9,7 @@ from strassen import _strassen, zeros_matrix
 def main():
 	run_multiplication_tests()
 
-def strassen_generalized(a, b):
+def strassen_generalized(a, b, stats = None):
 	"""
 	Strassen's Algorithm for matrix multiplication - Generalization for any input
 
@@ -27,7 +27,7 @@ def strassen_generalized(a, b):
 
 	[a, b] = pad_with_zeros_until_power_of_two(a, b)
 
-	result = _strassen(a, b) # Implemented on strassen.py
+	result = _strassen(a, b, stats) # Implemented on strassen.py
 
 	return extract_result_without_zero_padding(result, m, p)
 
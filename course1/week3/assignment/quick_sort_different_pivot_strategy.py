@@ -4,37 +4,129 @@
 """
 import random
 import os
-from typing import Literal
+import sys
+from functools import partial
+from typing import Callable, Dict, Literal, Union
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+import course_paths
+from instrumentation import Stats
+import quick_sort as quick_sort_engines
 
 # Type definitions
-PivotMethod = Literal["from_start", "from_end", "median_of_three"]
+# Any name added with register_pivot_strategy is also accepted
+PivotMethod = Union[Literal["from_start", "from_end", "median_of_three", "random", "ninther", "sampled_median", "auto"], str]
+# Receives (list, start, end) and returns the index of the pivot
+PivotStrategy = Callable[[list, int, int], int]
+
+# Number of elements whose median is the "sampled_median" pivot
+PIVOT_SAMPLE_SIZE = 15
+
+# Subarray sizes from which "auto" switches to ninther and to sampled median
+AUTO_NINTHER_THRESHOLD = 40
+AUTO_SAMPLED_MEDIAN_THRESHOLD = 10000
+
+# Pivot strategies by name, used by partition
+PIVOT_STRATEGIES: Dict[str, PivotStrategy] = {}
+
+def register_pivot_strategy(name, strategy: PivotStrategy):
+	"""
+	Makes a pivot strategy available to partition/quick_sort by its name
+	"""
+	PIVOT_STRATEGIES[name] = strategy
+
+def median_of_three_index(list, i, j, k):
+	"""
+	Index of the median of list[i], list[j] and list[k], without allocating anything
+	"""
+	a = list[i]
+	b = list[j]
+	c = list[k]
+	if (a < b):
+		if (b < c):
+			return j
+		return k if a < c else i
+	if (a < c):
+		return i
+	return k if b < c else j
+
+def pivot_from_start(list, start, end):
+	return start
+
+def pivot_from_end(list, start, end):
+	return end
+
+def pivot_median_of_three(list, start, end):
+	"""
+	Median of the first, middle and last elements.
+	For even lengths 2k the middle is the k-th element, as the assignment asks
+	"""
+	middle = start + (end - start) // 2
+	return median_of_three_index(list, start, middle, end)
+
+def pivot_random(list, start, end):
+	return random.randint(start, end)
+
+def pivot_ninther(list, start, end):
+	"""
+	Tukey's ninther: median of the medians of three groups of three elements
+	spread over the subarray. A much better pivot estimate than median of three
+	for the cost of 12 comparisons
+	"""
+	length = end - start + 1
+	if (length < 9):
+		return pivot_median_of_three(list, start, end)
+	step = length // 8
+	middle = start + (end - start) // 2
+	return median_of_three_index(
+		list,
+		median_of_three_index(list, start, start + step, start + 2*step),
+		median_of_three_index(list, middle - step, middle, middle + step),
+		median_of_three_index(list, end - 2*step, end - step, end)
+	)
+
+def make_sampled_median_strategy(sample_size) -> PivotStrategy:
+	"""
+	Creates a strategy that uses the median of sample_size evenly spaced elements
+	"""
+	def pivot_sampled_median(list, start, end):
+		length = end - start + 1
+		if (length <= sample_size):
+			return pivot_median_of_three(list, start, end)
+		last = sample_size - 1
+		sample = [start + (length - 1) * s // last for s in range(sample_size)]
+		sample.sort(key=list.__getitem__)
+		return sample[sample_size // 2]
+	return pivot_sampled_median
+
+def pivot_auto(list, start, end):
+	"""
+	Picks the strategy by the subarray size: median of three for small ones,
+	ninther for medium ones and sampled median for large ones
+	"""
+	length = end - start + 1
+	if (length < AUTO_NINTHER_THRESHOLD):
+		return pivot_median_of_three(list, start, end)
+	elif (length < AUTO_SAMPLED_MEDIAN_THRESHOLD):
+		return pivot_ninther(list, start, end)
+	return PIVOT_STRATEGIES["sampled_median"](list, start, end)
 
-# Global variable to store the number of comparisons made
-comparisons = 0
+register_pivot_strategy("from_start", pivot_from_start)
+register_pivot_strategy("from_end", pivot_from_end)
+register_pivot_strategy("median_of_three", pivot_median_of_three)
+register_pivot_strategy("random", pivot_random)
+register_pivot_strategy("ninther", pivot_ninther)
+register_pivot_strategy("sampled_median", make_sampled_median_strategy(PIVOT_SAMPLE_SIZE))
+register_pivot_strategy("auto", pivot_auto)
 
-def partition(list, start, end, pivot_method: PivotMethod):
-	# Counting comparisons made
-	global comparisons
+def partition(list, start, end, pivot_method: PivotMethod, stats = None):
 	length = end - start + 1
-	comparisons  += (length - 1)
 
 	## Selects pivot based on the method specified
-	pivot = 0
-	pivot_index = 0
-	if (pivot_method == "from_start"):
-		pivot_index = start
-		pivot = list[start]
-	elif (pivot_method == "from_end"):
-		pivot_index = end
-		pivot = list[end]
-	elif (pivot_method == "median_of_three"):
-		middle = start + (length // 2)
-		if (length % 2 == 0):
-			middle = middle -1
-		p_candidates = {start: list[start], middle: list[middle], end: list[end]}
-		p_candidates.pop(min(p_candidates, key=p_candidates.get))
-		pivot_index = min(p_candidates, key=p_candidates.get)
-		pivot = list[pivot_index]
+	if (pivot_method not in PIVOT_STRATEGIES):
+		raise Exception("Unknown pivot method: " + str(pivot_method))
+	pivot_index = PIVOT_STRATEGIES[pivot_method](list, start, end)
+	pivot = list[pivot_index]
 
 	# Positioning pivot at the beginning of the list
 	list[start], list[pivot_index] = list[pivot_index], list[start]
@@ -47,14 +139,36 @@ def partition(list, start, end, pivot_method: PivotMethod):
 			i += 1
 	# Moving pivot to it's correct position
 	list[start], list[i - 1] = list[i - 1], list[start]
+
+	# Counting comparisons made (m - 1, as the assignment asks) and swaps
+	if (stats is not None):
+		stats.comparisons += length - 1
+		stats.swaps += (i - start - 1) + 2
+
 	return i - 1 # Pivot index
 
-def quick_sort(list, start, end, pivot_method: PivotMethod):
+def quick_sort(list, start, end, pivot_method: PivotMethod, stats = None):
+	if (stats is not None):
+		stats.enter()
+
 	if (start < end):
-		pivotIndex = partition(list, start, end, pivot_method)
+		pivotIndex = partition(list, start, end, pivot_method, stats)
 
-		quick_sort(list, start, pivotIndex - 1, pivot_method)
-		quick_sort(list, pivotIndex + 1, end, pivot_method)
+		quick_sort(list, start, pivotIndex - 1, pivot_method, stats)
+		quick_sort(list, pivotIndex + 1, end, pivot_method, stats)
+
+	if (stats is not None):
+		stats.exit()
+
+def intro_sort(list, start, end, pivot_method: PivotMethod, stats = None):
+	"""
+	Introsort using the partition of this file (see intro_sort on ../quick_sort.py)
+
+	Loops on the larger partition, insertion sorts small ranges and heap sorts
+	after 2*log2(n) levels, so even from_start/from_end on sorted input
+	take O(n*logn) time and O(logn) stack
+	"""
+	quick_sort_engines.intro_sort(list, start, end, stats, partial(partition, pivot_method=pivot_method))
 
 def get_list_from_file():
 	"""
@@ -69,40 +183,62 @@ def run_with_assignment_input():
 	"""
 	Runs the code with the assignment input, test correctness and print the number of comparisons
 	"""
-	global comparisons
 	print("--- Running with assignment input... ---")
 	input = get_list_from_file()
 	expected_sorted = sorted(input)
+	comparison_counts = []
 
-	comparisons = 0
-	quick_sort(input, 0, len(input) - 1, "from_start")
+	stats = Stats("from_start")
+	quick_sort(input, 0, len(input) - 1, "from_start", stats)
 	if (expected_sorted == input):
 		print("PASSED - Correctness of quick_sort with pivot from start")
-		print("Comparisons pivot from start: ", comparisons)
+		print("Comparisons pivot from start: ", stats.comparisons)
+		comparison_counts.append((stats.name, stats.comparisons))
 	else:
 		print("--> FAILED - Correctness of quick_sort with pivot from start")
 	print()
 
-	comparisons = 0
+	stats = Stats("from_end")
 	input = get_list_from_file()
-	quick_sort(input, 0, len(input) - 1, "from_end")
+	quick_sort(input, 0, len(input) - 1, "from_end", stats)
 	if (expected_sorted == input):
 		print("PASSED - Correctness of quick_sort with pivot from end")
-		print("Comparisons pivot from end: ", comparisons)
+		print("Comparisons pivot from end: ", stats.comparisons)
+		comparison_counts.append((stats.name, stats.comparisons))
 	else:
 		print("--> FAILED - Correctness of quick_sort with pivot from end")
 	print()
 
-	comparisons = 0
+	stats = Stats("median_of_three")
 	input = get_list_from_file()
-	quick_sort(input, 0, len(input) - 1, "median_of_three")
+	quick_sort(input, 0, len(input) - 1, "median_of_three", stats)
 	if (expected_sorted == input):
 		print("PASSED - Correctness of quick_sort with pivot as median_of_three")
-		print("Comparisons median_of_three: ", comparisons)
+		print("Comparisons median_of_three: ", stats.comparisons)
+		comparison_counts.append((stats.name, stats.comparisons))
 	else:
 		print("--> FAILED - Correctness of quick_sort with pivot as median_of_three")
 	print()
 
+	# Dual pivot with the first and last elements as pivots (Yaroslavskiy's original),
+	# so the count is the same on every run. Every comparison between elements is
+	# counted, which for one pivot is the m - 1 per partition above
+	stats = Stats("dual_pivot")
+	input = get_list_from_file()
+	quick_sort_engines.dual_pivot_quick_sort(input, 0, len(input) - 1, stats, random_pivots=False)
+	if (expected_sorted == input):
+		print("PASSED - Correctness of dual_pivot_quick_sort")
+		print("Comparisons dual pivot: ", stats.comparisons, " Swaps: ", stats.swaps)
+		comparison_counts.append((stats.name, stats.comparisons))
+	else:
+		print("--> FAILED - Correctness of dual_pivot_quick_sort")
+	print()
+
+	print("Comparisons side by side:")
+	for (name, comparisons) in comparison_counts:
+		print("%-16s %d" % (name, comparisons))
+	print()
+
 def test_quick_sort():
 	"""
 	Tests with multiple random inputs to ensure robustness
@@ -148,14 +284,67 @@ def test_quick_sort():
 		print("--> FAILED quick_sort with pivot as median of three")
 	print()
 
+def test_pivot_strategies():
+	"""
+	Tests every registered strategy, including a custom one
+	"""
+	print("--- Running pivot strategies tests... ---")
+	register_pivot_strategy("from_middle", lambda list, start, end: (start + end) // 2)
+	for pivot_method in PIVOT_STRATEGIES:
+		passed = True
+		for _ in range(50):
+			test_list = [random.randint(1, random.choice([10, 2000])) for _ in range(random.randint(2, 900))]
+			expected_sorted = sorted(test_list)
+			quick_sort(test_list, 0, len(test_list) - 1, pivot_method)
+			if (test_list != expected_sorted):
+				passed = False
+				break
+		if(passed):
+			print("PASSED quick_sort with pivot", pivot_method)
+		else:
+			print("--> FAILED quick_sort with pivot", pivot_method)
+	del PIVOT_STRATEGIES["from_middle"]
+
+	# Example from the assignment: [8, 2, 4, 5, 7, 1] -> 4 is the pivot
+	if (pivot_median_of_three([8, 2, 4, 5, 7, 1], 0, 5) == 2 and pivot_median_of_three([4, 5, 6, 7], 0, 3) == 1):
+		print("PASSED median_of_three pivot index")
+	else:
+		print("--> FAILED median_of_three pivot index")
+	print()
+
+def test_intro_sort():
+	"""
+	Sorted and reversed inputs that are too deep for the recursive quick_sort
+	"""
+	print("--- Running intro_sort tests... ---")
+	for pivot_method in ("from_start", "from_end", "median_of_three"):
+		passed = True
+		for test_list in (list(range(100000)), list(range(100000, 0, -1)), random.sample(range(1,2000), 1500)):
+			expected_sorted = sorted(test_list)
+			stats = Stats(pivot_method)
+			intro_sort(test_list, 0, len(test_list) - 1, pivot_method, stats)
+			if (test_list != expected_sorted or stats.depth != 0):
+				passed = False
+				break
+		if(passed):
+			print("PASSED intro_sort with pivot", pivot_method)
+		else:
+			print("--> FAILED intro_sort with pivot", pivot_method)
+	print()
+
 
 def main():
 	test_quick_sort()
+	test_pivot_strategies()
+	test_intro_sort()
 	run_with_assignment_input()
 
-main()
+# Runs code
+if __name__ == "__main__":
+	main()
 
 # Expected comparisons number:
 # quick_sort_pivot_start: 162085
 # quick_sort_pivot_end: 164123
 # quick_sort_pivot_median_of_three: 138382
+# dual_pivot_quick_sort (first and last elements as pivots): 153230
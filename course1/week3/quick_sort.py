@@ -1,6 +1,23 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import math
+import os
 import random
+import sys
+import time
 
-def partition(list, start, end):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import course_paths
+from instrumentation import Stats
+
+# Ranges up to this size are insertion sorted by intro_sort
+INSERTION_SORT_THRESHOLD = 16
+
+# Ranges shorter than this are sorted serially by parallel_quick_sort
+PARALLEL_CUTOFF = 50000
+
+def partition(list, start, end, stats = None):
 	"""
 	Randomly selects an element of the array as pivot
 	then rearrange the array such that every element to the left of the array
@@ -24,19 +41,396 @@ def partition(list, start, end):
 	list[end] = list[i + 1]
 	list[i + 1] = pivot
 
+	if (stats is not None):
+		stats.comparisons += end - start
+		# Swaps inside the loop + moving the pivot to the end and back
+		stats.swaps += (i - start + 1) + 2
+
 	return i + 1 # Pivot index
 
-def quick_sort(list, start, end):
+def partition_three_way(list, start, end, stats = None, pivot_index = None):
+	"""
+	Three way (Dutch national flag) partition around a random pivot (unless pivot_index is given)
+	Rearranges list[start..end] in: less than pivot | equal to pivot | greater than pivot
+	Returns (first, last) indexes of the elements equal to the pivot
+
+	Equal keys are grouped in one pass and never partitioned again,
+	so inputs with few distinct values don't degrade to O(n^2)
+	"""
+	if (pivot_index is None):
+		pivot_index = random.randint(start, end)
+	pivot = list[pivot_index]
+	less_end = start # list[start..less_end - 1] < pivot
+	i = start
+	greater_start = end # list[greater_start + 1..end] > pivot
+	while (i <= greater_start):
+		value = list[i]
+		if (value < pivot):
+			list[less_end], list[i] = value, list[less_end]
+			less_end += 1
+			i += 1
+		elif (value > pivot):
+			list[greater_start], list[i] = value, list[greater_start]
+			greater_start -= 1
+		else:
+			i += 1
+
+	if (stats is not None):
+		# Every element is compared with "<", the ones not less also with ">"
+		length = end - start + 1
+		stats.comparisons += 2*length - (less_end - start)
+		stats.swaps += (less_end - start) + (end - greater_start)
+
+	return (less_end, greater_start)
+
+def quick_sort(list, start, end, stats = None, three_way = False):
 	"""
 	Recursevely sorts an array of numbers
 	Time complexity: Best case/Average = O(n*logn) / Worst case = O(n^2)
 	Space complexity: O(1)
+
+	three_way - uses partition_three_way, for inputs with many duplicates
 	"""
+	if (stats is not None):
+		stats.enter()
+
+	if (start < end and three_way):
+		(first_equal, last_equal) = partition_three_way(list, start, end, stats)
+
+		quick_sort(list, start, first_equal - 1, stats, three_way)
+		quick_sort(list, last_equal + 1, end, stats, three_way)
+	elif (start < end):
+		pivotIndex = partition(list, start, end, stats)
+
+		quick_sort(list, start, pivotIndex - 1, stats)
+		quick_sort(list, pivotIndex + 1, end, stats)
+
+	if (stats is not None):
+		stats.exit()
+
+def dual_pivot_partition(list, start, end, stats = None, random_pivots = True):
+	"""
+	Yaroslavskiy's dual pivot partition with two random pivots p <= q
+	(list[start] and list[end] when random_pivots is False, as in the original)
+	Rearranges list[start..end] in: less than p | p | between p and q | q | greater or equal to q
+	Returns the final indexes of p and q
+	"""
+	comparisons = 1
+	swaps = 0
+	if (random_pivots):
+		# Moves the random pivots to the ends
+		first = random.randint(start, end)
+		list[start], list[first] = list[first], list[start]
+		second = random.randint(start + 1, end)
+		list[end], list[second] = list[second], list[end]
+		swaps = 2
+	# Smaller pivot first
+	if (list[start] > list[end]):
+		list[start], list[end] = list[end], list[start]
+		swaps += 1
+	p = list[start]
+	q = list[end]
+
+	less = start + 1 # list[start + 1..less - 1] < p
+	great = end - 1 # list[great + 1..end - 1] >= q
+	k = less
+	if (stats is None):
+		while (k <= great):
+			value = list[k]
+			if (value < p):
+				list[k] = list[less]
+				list[less] = value
+				less += 1
+			elif (value >= q):
+				while (list[great] > q and k < great):
+					great -= 1
+				list[k] = list[great]
+				list[great] = value
+				great -= 1
+				if (list[k] < p):
+					list[k], list[less] = list[less], list[k]
+					less += 1
+			k += 1
+	else:
+		# Same loop, counting comparisons and element moves
+		while (k <= great):
+			value = list[k]
+			comparisons += 1
+			if (value < p):
+				list[k] = list[less]
+				list[less] = value
+				less += 1
+				swaps += 1
+			else:
+				comparisons += 1
+				if (value >= q):
+					comparisons += 1
+					while (list[great] > q and k < great):
+						great -= 1
+						comparisons += 1
+					list[k] = list[great]
+					list[great] = value
+					great -= 1
+					swaps += 1
+					comparisons += 1
+					if (list[k] < p):
+						list[k], list[less] = list[less], list[k]
+						less += 1
+						swaps += 1
+			k += 1
+
+	# Moves the pivots to their correct positions
+	less -= 1
+	great += 1
+	list[start], list[less] = list[less], list[start]
+	list[end], list[great] = list[great], list[end]
+
+	if (stats is not None):
+		stats.comparisons += comparisons
+		stats.swaps += swaps + 2
+
+	return (less, great)
+
+def dual_pivot_quick_sort(list, start, end, stats = None, random_pivots = True):
+	"""
+	Dual pivot quick sort (the default sort engine for primitives in Java)
+	Splits each subarray in three parts around two pivots, which needs fewer
+	swaps and less passes over memory than the single pivot partition
+
+	random_pivots - False takes the first and last elements as pivots, so the
+	comparisons are the same on every run
+
+	Time complexity: Best case/Average = O(n*logn) / Worst case = O(n^2)
+	Space complexity: O(1)
+	"""
+	if (stats is not None):
+		stats.enter()
+
 	if (start < end):
-		pivotIndex = partition(list, start, end)
+		(left_pivot, right_pivot) = dual_pivot_partition(list, start, end, stats, random_pivots)
 
-		quick_sort(list, start, pivotIndex - 1)
-		quick_sort(list, pivotIndex + 1, end)
+		dual_pivot_quick_sort(list, start, left_pivot - 1, stats, random_pivots)
+		dual_pivot_quick_sort(list, left_pivot + 1, right_pivot - 1, stats, random_pivots)
+		dual_pivot_quick_sort(list, right_pivot + 1, end, stats, random_pivots)
+
+	if (stats is not None):
+		stats.exit()
+
+def intro_sort(list, start, end, stats = None, partition_function = None):
+	"""
+	Introsort: quick sort that can't degrade
+
+	- Loops on the larger partition and recurses only on the smaller one,
+	so the stack depth is O(log(n)) even with bad pivots
+	- Ranges up to INSERTION_SORT_THRESHOLD elements are insertion sorted
+	- After 2*log2(n) levels of partitioning the range is heap sorted
+
+	partition_function(list, start, end, stats = None) returns the pivot index,
+	the random partition of this file is used by default
+
+	Time complexity: O(n*logn) for any pivot choice
+	Space complexity: O(logn)
+	"""
+	if (partition_function is None):
+		partition_function = partition
+	if (start < end):
+		depth_limit = 2 * int(math.log2(end - start + 1))
+		_intro_sort(list, start, end, depth_limit, stats, partition_function)
+
+def _intro_sort(list, start, end, depth_limit, stats, partition_function):
+	if (stats is not None):
+		stats.enter()
+
+	while (end - start + 1 > INSERTION_SORT_THRESHOLD):
+		if (depth_limit == 0):
+			heap_sort(list, start, end, stats)
+			break
+		depth_limit -= 1
+
+		pivot_index = partition_function(list, start, end, stats=stats)
+		if (pivot_index - start < end - pivot_index):
+			_intro_sort(list, start, pivot_index - 1, depth_limit, stats, partition_function)
+			start = pivot_index + 1
+		else:
+			_intro_sort(list, pivot_index + 1, end, depth_limit, stats, partition_function)
+			end = pivot_index - 1
+	else:
+		insertion_sort(list, start, end, stats)
+
+	if (stats is not None):
+		stats.exit()
+
+def insertion_sort(list, start, end, stats = None):
+	"""
+	Sorts list[start..end] (inclusive) in place
+	"""
+	if (stats is None):
+		for i in range(start + 1, end + 1):
+			value = list[i]
+			j = i - 1
+			while (j >= start and list[j] > value):
+				list[j + 1] = list[j]
+				j = j - 1
+			list[j + 1] = value
+		return
+
+	# Same loop, counting comparisons and element moves
+	for i in range(start + 1, end + 1):
+		value = list[i]
+		j = i - 1
+		while (j >= start and list[j] > value):
+			list[j + 1] = list[j]
+			j = j - 1
+		stats.comparisons += (i - j) if j >= start else (i - j - 1)
+		stats.swaps += i - j - 1
+		list[j + 1] = value
+
+def heap_sort(list, start, end, stats = None):
+	"""
+	Sorts list[start..end] (inclusive) in place with a max heap
+
+	Time complexity: O(n*logn) worst case
+	Space complexity: O(1)
+	"""
+	size = end - start + 1
+	if (stats is None):
+		for root in range(size // 2 - 1, -1, -1):
+			_sift_down(list, start, root, size)
+		for last in range(size - 1, 0, -1):
+			# Moves the max to the end of the heap
+			list[start], list[start + last] = list[start + last], list[start]
+			_sift_down(list, start, 0, last)
+		return
+
+	# Same loops, counting comparisons
+	comparisons = 0
+	for root in range(size // 2 - 1, -1, -1):
+		comparisons += _counted_sift_down(list, start, root, size)
+	for last in range(size - 1, 0, -1):
+		list[start], list[start + last] = list[start + last], list[start]
+		comparisons += _counted_sift_down(list, start, 0, last)
+	stats.comparisons += comparisons
+	stats.swaps += size - 1
+
+def _sift_down(list, offset, root, size):
+	"""
+	Moves list[offset + root] down the heap of "size" elements stored from offset
+	"""
+	value = list[offset + root]
+	child = 2*root + 1
+	while (child < size):
+		if (child + 1 < size and list[offset + child] < list[offset + child + 1]):
+			child += 1
+		if (not (value < list[offset + child])):
+			break
+		list[offset + root] = list[offset + child]
+		root = child
+		child = 2*root + 1
+	list[offset + root] = value
+
+def _counted_sift_down(list, offset, root, size):
+	"""
+	Same as _sift_down, returning the number of comparisons made
+	"""
+	comparisons = 0
+	value = list[offset + root]
+	child = 2*root + 1
+	while (child < size):
+		if (child + 1 < size):
+			comparisons += 1
+			if (list[offset + child] < list[offset + child + 1]):
+				child += 1
+		comparisons += 1
+		if (not (value < list[offset + child])):
+			break
+		list[offset + root] = list[offset + child]
+		root = child
+		child = 2*root + 1
+	list[offset + root] = value
+	return comparisons
+
+# Parallel quick sort
+
+# Shared memory buffer attached by each worker process
+_worker_buffer = {}
+
+def _attach_worker_buffer(name):
+	"""
+	Process pool initializer. Attaches the shared int64 buffer once per worker
+	"""
+	memory = shared_memory.SharedMemory(name=name)
+	_worker_buffer["memory"] = memory
+	_worker_buffer["view"] = memory.buf.cast("q")
+
+def _sort_shared_range(start, end):
+	"""
+	Sorts view[start..end] (inclusive) of the shared buffer with the serial intro_sort
+
+	The range is copied to a list and written back on purpose: indexing the
+	memoryview is slower than indexing a list, and intro_sort directly on the
+	view took about 1.6x as long on 10^6 numbers. The copy stays in the worker,
+	only the range indexes cross processes
+	"""
+	view = _worker_buffer["view"]
+	subarray = view[start : end + 1].tolist()
+	intro_sort(subarray, 0, len(subarray) - 1)
+	view[start : end + 1] = array("q", subarray)
+
+def parallel_quick_sort(list, start, end, workers = None, cutoff = PARALLEL_CUTOFF):
+	"""
+	Multi process quick sort of int64 numbers. Sorts list[start..end] in place
+
+	The numbers are copied once to a shared memory buffer, where the largest
+	range is partitioned (three way, random pivot) until there is one range per
+	worker. Each worker then sorts its range of the shared buffer, since ranges
+	are independent after partitioning: it copies the range to a local list,
+	sorts it with the serial intro_sort and writes it back (see _sort_shared_range).
+	Only range indexes are sent to the workers.
+
+	Falls back to the serial intro_sort for ranges shorter than cutoff
+	"""
+	n = end - start + 1
+	if (workers is None):
+		workers = os.cpu_count() or 1
+	if (n < max(cutoff, 2) or workers <= 1):
+		intro_sort(list, start, end)
+		return
+
+	memory = shared_memory.SharedMemory(create=True, size=n*8)
+	view = memory.buf.cast("q")
+	try:
+		view[:] = array("q", list[start : end + 1])
+
+		# Splits the largest range until there is one range per worker
+		ranges = [(0, n - 1)]
+		while (len(ranges) < workers):
+			largest = max(range(len(ranges)), key=lambda r: ranges[r][1] - ranges[r][0])
+			(range_start, range_end) = ranges[largest]
+			if (range_end - range_start + 1 < cutoff):
+				break
+			(first_equal, last_equal) = partition_three_way(view, range_start, range_end)
+			ranges[largest : largest + 1] = [
+				(sub_start, sub_end)
+				for (sub_start, sub_end) in ((range_start, first_equal - 1), (last_equal + 1, range_end))
+				if sub_start < sub_end
+			]
+			if (len(ranges) == 0):
+				break
+
+		with ProcessPoolExecutor(
+			max_workers=workers,
+			initializer=_attach_worker_buffer,
+			initargs=(memory.name,)
+		) as executor:
+			futures = [executor.submit(_sort_shared_range, range_start, range_end) for (range_start, range_end) in ranges]
+			for future in futures:
+				future.result()
+
+		list[start : end + 1] = view.tolist()
+	finally:
+		view.release()
+		memory.close()
+		memory.unlink()
 
 def test_quick_sort():
 	print("Running tests...")
@@ -53,4 +447,165 @@ def test_quick_sort():
 	else:
 		print("--> FAILED quick_sort")
 
-test_quick_sort()
+def test_quick_sort_instrumentation():
+	test_list = random.sample(range(1,2000), 1000)
+	stats = Stats("quick_sort")
+	quick_sort(test_list, 0, len(test_list) - 1, stats)
+	# At least n - 1 comparisons (first partition) and n calls (one per pivot)
+	if (test_list == sorted(test_list) and stats.comparisons >= 999
+		and stats.calls >= 1000 and stats.depth == 0 and stats.max_depth > 1):
+		print("PASSED quick_sort instrumentation")
+	else:
+		print("--> FAILED quick_sort instrumentation -", stats)
+
+def test_dual_pivot_quick_sort():
+	passed = True
+	for _ in range(100):
+		test_list = [random.randint(1, random.choice([1, 3, 2000])) for _ in range(random.randint(0, 1500))]
+		expected_sorted = sorted(test_list)
+		stats = Stats("dual_pivot_quick_sort")
+		dual_pivot_quick_sort(test_list, 0, len(test_list) - 1, stats)
+		if (test_list != expected_sorted or stats.depth != 0):
+			passed = False
+			break
+	if(passed):
+		print("PASSED dual_pivot_quick_sort")
+	else:
+		print("--> FAILED dual_pivot_quick_sort")
+
+	# The comparisons counted must be the ones the elements see
+	for random_pivots in (True, False):
+		compared = [0]
+		test_list = [_CountedValue(random.randint(1, random.choice([3, 2000])), compared) for _ in range(2000)]
+		expected_sorted = sorted(value.value for value in test_list)
+		compared[0] = 0
+		stats = Stats("dual_pivot_quick_sort")
+		dual_pivot_quick_sort(test_list, 0, len(test_list) - 1, stats, random_pivots)
+		if ([value.value for value in test_list] == expected_sorted and stats.comparisons == compared[0]):
+			print("PASSED dual_pivot_quick_sort comparisons - random pivots:", random_pivots, "-", stats.comparisons)
+		else:
+			print("--> FAILED dual_pivot_quick_sort comparisons - random pivots:", random_pivots,
+				"- Counted:", stats.comparisons, "Made:", compared[0])
+
+class _CountedValue:
+	"""
+	Number that counts every comparison made with it in compared[0]
+	"""
+	__slots__ = ("value", "compared")
+
+	def __init__(self, value, compared):
+		self.value = value
+		self.compared = compared
+
+	def __lt__(self, other):
+		self.compared[0] += 1
+		return self.value < other.value
+
+	def __gt__(self, other):
+		self.compared[0] += 1
+		return self.value > other.value
+
+	def __le__(self, other):
+		self.compared[0] += 1
+		return self.value <= other.value
+
+	def __ge__(self, other):
+		self.compared[0] += 1
+		return self.value >= other.value
+
+def test_parallel_quick_sort():
+	passed = True
+	for _ in range(5):
+		test_list = [random.randint(-10**12, random.choice([5, 10**12])) for _ in range(random.randint(2, 20000))]
+		expected_sorted = sorted(test_list)
+		workers = random.randint(2, 5)
+		parallel_quick_sort(test_list, 0, len(test_list) - 1, workers, cutoff=100)
+		if (test_list != expected_sorted):
+			passed = False
+			break
+
+	# Only part of the list
+	test_list = random.sample(range(1,20000), 10000)
+	expected_sorted = test_list[:1000] + sorted(test_list[1000:9000]) + test_list[9000:]
+	parallel_quick_sort(test_list, 1000, 8999, 3, cutoff=100)
+	if (test_list != expected_sorted):
+		passed = False
+
+	if(passed):
+		print("PASSED parallel_quick_sort")
+	else:
+		print("--> FAILED parallel_quick_sort")
+
+def test_intro_sort():
+	passed = True
+	for _ in range(100):
+		test_list = [random.randint(1, random.choice([5, 2000])) for _ in range(random.randint(0, 1500))]
+		expected_sorted = sorted(test_list)
+		intro_sort(test_list, 0, len(test_list) - 1)
+		if (test_list != expected_sorted):
+			passed = False
+			break
+
+	# Heap sort on its own, and a partition that always peels off the first element
+	test_list = random.sample(range(1,2000), 1000)
+	heap_sort(test_list, 100, 899)
+	expected_sorted = test_list[:100] + sorted(test_list[100:900]) + test_list[900:]
+	if (test_list != expected_sorted):
+		passed = False
+
+	test_list = list(range(100000))
+	stats = Stats("intro_sort")
+	intro_sort(test_list, 0, len(test_list) - 1, stats, lambda list, start, end, stats: start)
+	if (test_list != sorted(test_list) or stats.max_depth > 2 * math.log2(100000) + 2):
+		passed = False
+
+	if(passed):
+		print("PASSED intro_sort")
+	else:
+		print("--> FAILED intro_sort")
+
+def test_quick_sort_three_way():
+	passed = True
+	for _ in range(100):
+		test_list = [random.randint(1, random.choice([1, 3, 10, 2000])) for _ in range(random.randint(0, 1500))]
+		expected_sorted = sorted(test_list)
+		quick_sort(test_list, 0, len(test_list) - 1, three_way=True)
+		if (test_list != expected_sorted):
+			passed = False
+			break
+	if(passed):
+		print("PASSED quick_sort three way")
+	else:
+		print("--> FAILED quick_sort three way")
+
+def run_duplicates_benchmark():
+	"""
+	Two way vs three way partitioning on a column with 10 distinct values
+	Run with: python quick_sort.py benchmark
+	"""
+	print()
+	print("Benchmark - 10 distinct values")
+	for (n, engines) in ((5000, (False, True)), (1000000, (True,))):
+		column = [random.randint(1, 10) for _ in range(n)]
+		for three_way in engines:
+			test_list = column[:]
+			stats = Stats("three_way" if three_way else "two_way")
+			start = time.perf_counter()
+			quick_sort(test_list, 0, n - 1, stats, three_way)
+			elapsed = time.perf_counter() - start
+			print("n = %7d - %-9s %8.3fs  comparisons: %d" % (n, stats.name, elapsed, stats.comparisons))
+	print("(two way is O(n^2) here and already too deep for the recursion limit with n = 10^6)")
+
+def main():
+	test_quick_sort()
+	test_quick_sort_instrumentation()
+	test_quick_sort_three_way()
+	test_dual_pivot_quick_sort()
+	test_intro_sort()
+	test_parallel_quick_sort()
+	if ("benchmark" in sys.argv[1:]):
+		run_duplicates_benchmark()
+
+# Runs code
+if __name__ == "__main__":
+	main()
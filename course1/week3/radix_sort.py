@@ -0,0 +1,242 @@
+"""
+    Author: Leonardo Ribeiro
+    Python Version: 3.8.10
+
+	Radix sort for integers
+
+	Integers are sorted one byte at a time with counting passes, no comparisons.
+	Running time: O(n*k) where k is the number of bytes of (max - min)
+
+	- LSD: stable passes from the least significant byte to the most significant
+	- MSD: partitions by the most significant byte, then recursively by the next ones
+	(only the buckets with more than one element go on, small ones are insertion sorted)
+	- Counting sort when max - min is small compared to n (a single pass)
+
+	Negative numbers are handled by sorting value - min (NumPy: flipping the sign bit,
+	so int64 values are ordered as unsigned integers)
+
+	Same in place contract as quick_sort: radix_sort(list, start, end)
+"""
+from itertools import chain
+from typing import Literal
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import course_paths
+from instrumentation import Stats
+from quick_sort import insertion_sort, intro_sort
+
+# NumPy is optional, only used by the vectorized backend
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# Type definitions
+RadixMethod = Literal["lsd", "msd"]
+
+# Counting sort is used when max - min + 1 <= COUNTING_SORT_FACTOR * n (or <= 256)
+COUNTING_SORT_FACTOR = 2
+
+# MSD buckets up to this size are insertion sorted
+MSD_INSERTION_THRESHOLD = 32
+
+# Minimum size to use the NumPy backend when it's available
+NUMPY_THRESHOLD = 10000
+
+def radix_sort(list, start, end, stats = None, method: RadixMethod = "lsd", use_numpy = None):
+	"""
+	Sorts list[start..end] (inclusive) of integers in place
+	Raises TypeError (leaving the list untouched) if there's any other value
+
+	use_numpy - None uses NumPy for big ranges if it's installed (int64 values only)
+	"""
+	n = end - start + 1
+	if (n <= 1):
+		return
+	if (method not in ("lsd", "msd")):
+		raise Exception("Unknown radix sort method: " + str(method))
+
+	values = list[start : end + 1]
+	# The NumPy backend would truncate floats to int64, so every backend rejects them
+	if (not all(isinstance(value, int) for value in values)):
+		raise TypeError("radix_sort only sorts integers")
+	minimum = min(values)
+	maximum = max(values)
+	span = maximum - minimum + 1
+
+	if (span <= max(256, COUNTING_SORT_FACTOR * n)):
+		result = counting_sort(values, minimum, maximum)
+		passes = 1
+	else:
+		if (use_numpy is None):
+			use_numpy = (numpy is not None and n >= NUMPY_THRESHOLD and -2**63 <= minimum and maximum < 2**63)
+		if (use_numpy):
+			(result, passes) = _radix_sort_numpy(values)
+		elif (method == "lsd"):
+			(result, passes) = _lsd_radix_sort([value - minimum for value in values], span - 1)
+			result = [key + minimum for key in result]
+		else:
+			keys = [value - minimum for value in values]
+			byte_count = ((span - 1).bit_length() + 7) // 8
+			passes = _msd_radix_sort(keys, 0, n, 8*(byte_count - 1))
+			result = [key + minimum for key in keys]
+
+	list[start : end + 1] = result
+
+	if (stats is not None):
+		stats.count("passes", passes)
+		stats.allocations += n * (passes + 1)
+
+def counting_sort(values, minimum, maximum):
+	"""
+	Returns the values sorted by counting the occurrences of each one
+	Time complexity: O(n + (maximum - minimum))
+	"""
+	counts = [0]*(maximum - minimum + 1)
+	for value in values:
+		counts[value - minimum] += 1
+	result = []
+	for (offset, count) in enumerate(counts):
+		if (count):
+			result.extend([offset + minimum]*count)
+	return result
+
+def _lsd_radix_sort(keys, maximum_key):
+	"""
+	LSD radix sort of non negative keys. Returns (sorted keys, number of passes)
+	Each pass distributes the keys in 256 buckets by one byte, keeping their order
+	"""
+	passes = 0
+	shift = 0
+	while ((maximum_key >> shift) > 0):
+		buckets = [[] for _ in range(256)]
+		for key in keys:
+			buckets[(key >> shift) & 255].append(key)
+		keys = [*chain.from_iterable(buckets)]
+		shift += 8
+		passes += 1
+	return (keys, passes)
+
+def _msd_radix_sort(keys, start, end, shift):
+	"""
+	MSD radix sort of the non negative keys[start:end] in place, from the byte at "shift"
+	Returns the number of bucket passes made
+	"""
+	if (end - start <= MSD_INSERTION_THRESHOLD):
+		insertion_sort(keys, start, end - 1)
+		return 0
+
+	buckets = [[] for _ in range(256)]
+	for i in range(start, end):
+		key = keys[i]
+		buckets[(key >> shift) & 255].append(key)
+
+	passes = 1
+	position = start
+	for bucket in buckets:
+		bucket_end = position + len(bucket)
+		keys[position : bucket_end] = bucket
+		if (shift > 0 and len(bucket) > 1):
+			passes += _msd_radix_sort(keys, position, bucket_end, shift - 8)
+		position = bucket_end
+	return passes
+
+def _radix_sort_numpy(values):
+	"""
+	Vectorized LSD radix sort of int64 values. Returns (sorted list, number of passes)
+
+	The sign bit is flipped so the keys order as unsigned integers. Each pass is
+	a stable argsort of one byte (NumPy sorts 8 bit integers with a counting sort)
+	and bytes that are equal for every key are skipped
+	"""
+	keys = numpy.asarray(values, dtype=numpy.int64).view(numpy.uint64) ^ numpy.uint64(1 << 63)
+	passes = 0
+	for shift in range(0, 64, 8):
+		digits = ((keys >> numpy.uint64(shift)) & numpy.uint64(255)).astype(numpy.uint8)
+		if (digits.min() == digits.max()):
+			continue
+		keys = keys[numpy.argsort(digits, kind="stable")]
+		passes += 1
+	result = (keys ^ numpy.uint64(1 << 63)).view(numpy.int64)
+	return (result.tolist(), passes)
+
+# Tests
+
+def test_radix_sort():
+	print("Running tests...")
+	methods = [("lsd", False), ("msd", False)]
+	if (numpy is not None):
+		methods.append(("lsd", True))
+	for (method, use_numpy) in methods:
+		passed = True
+		for _ in range(100):
+			n = random.randint(0, 2000)
+			bound = random.choice([10, 10**4, 10**9, 2**62])
+			test_list = [random.randint(-bound, bound) for _ in range(n)]
+			expected_sorted = sorted(test_list)
+			radix_sort(test_list, 0, n - 1, method=method, use_numpy=use_numpy)
+			if (test_list != expected_sorted):
+				passed = False
+				break
+		if (passed):
+			print("PASSED radix_sort", method, "(NumPy)" if use_numpy else "")
+		else:
+			print("--> FAILED radix_sort", method, "(NumPy)" if use_numpy else "", "- Input:", test_list)
+
+	# Only part of the list, counting sort shortcut and instrumentation
+	test_list = random.sample(range(1, 12000), 10000)
+	expected_sorted = test_list[:1000] + sorted(test_list[1000:9000]) + test_list[9000:]
+	stats = Stats("radix_sort")
+	radix_sort(test_list, 1000, 8999, stats)
+	if (test_list == expected_sorted and stats.counters["passes"] == 1 and stats.comparisons == 0):
+		print("PASSED radix_sort subarray with counting sort")
+	else:
+		print("--> FAILED radix_sort subarray with counting sort -", stats)
+
+def test_radix_sort_rejects_floats():
+	backends = [False] + ([True] if numpy is not None else [])
+	for use_numpy in backends:
+		test_list = [random.randrange(10**9) for _ in range(20000)]
+		test_list[1234] = 0.5
+		original = test_list[:]
+		try:
+			radix_sort(test_list, 0, len(test_list) - 1, use_numpy=use_numpy)
+			print("--> FAILED radix_sort with a float", "(NumPy)" if use_numpy else "")
+		except TypeError:
+			if (test_list == original):
+				print("PASSED radix_sort rejects a float", "(NumPy)" if use_numpy else "")
+			else:
+				print("--> FAILED radix_sort with a float changed the list", "(NumPy)" if use_numpy else "")
+
+def run_benchmark(n = 1000000):
+	"""
+	Run with: python radix_sort.py benchmark
+	"""
+	print()
+	print("Benchmark - %d random 32 bit integers" % n)
+	data = [random.randrange(2**32) for _ in range(n)]
+	engines = [("sorted()", lambda values: values.sort()),
+		("intro_sort", lambda values: intro_sort(values, 0, n - 1)),
+		("radix_sort lsd", lambda values: radix_sort(values, 0, n - 1, use_numpy=False)),
+		("radix_sort msd", lambda values: radix_sort(values, 0, n - 1, method="msd", use_numpy=False))]
+	if (numpy is not None):
+		engines.append(("radix_sort NumPy", lambda values: radix_sort(values, 0, n - 1, use_numpy=True)))
+	for (name, sort) in engines:
+		values = data[:]
+		start = time.perf_counter()
+		sort(values)
+		print("%-17s %.3fs" % (name, time.perf_counter() - start))
+
+def main():
+	test_radix_sort()
+	test_radix_sort_rejects_floats()
+	if ("benchmark" in sys.argv[1:]):
+		run_benchmark()
+
+# Runs code
+if __name__ == "__main__":
+	main()
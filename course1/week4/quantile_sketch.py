@@ -0,0 +1,265 @@
+"""
+    Author: Leonardo Ribeiro
+    Python Version: 3.8.10
+
+	Streaming quantile sketch (KLL)
+
+	Approximate quantiles of a stream in bounded memory, without keeping or
+	reordering the values like select() does.
+
+	The sketch is a stack of compactors. Level h holds items that each stand for
+	2^h values of the stream. When a level is full it's sorted and every other
+	item (random offset) is promoted to the next level. The capacities shrink
+	geometrically (by 2/3) from the top level down, so the memory is O(k) and
+	the rank error is about 1.7/k * n with high probability.
+
+	Sketches built with the same k can be merged (e.g. one per process or
+	per time window) and serialized to bytes.
+
+	Usage:
+		sketch = KLLSketch(k=200)
+		for value in stream:
+			sketch.update(value)
+		p99 = sketch.quantile(0.99)
+"""
+from array import array
+import math
+import random
+import struct
+import time
+
+from randomized_select import quantiles
+
+DEFAULT_K = 200
+
+# Capacity ratio between a level and the one above it
+CAPACITY_RATIO = 2 / 3
+
+# k, number of values, number of levels, min and max
+_HEADER = struct.Struct("<IQIdd")
+
+class KLLSketch:
+	"""
+	Mergeable approximate quantiles of a stream of numbers (stored as floats)
+	"""
+
+	def __init__(self, k = DEFAULT_K, seed = None):
+		if (k < 8):
+			raise Exception("k must be at least 8")
+		self.k = k
+		self.n = 0
+		self.min = math.inf
+		self.max = -math.inf
+		self._levels = [[]]
+		self._size = 0
+		self._max_size = self._capacity(0)
+		self._random = random.Random(seed)
+
+	def _capacity(self, level):
+		height = len(self._levels)
+		return int(math.ceil(self.k * CAPACITY_RATIO ** (height - level - 1))) + 1
+
+	def _grow(self):
+		self._levels.append([])
+		self._max_size = sum(self._capacity(level) for level in range(len(self._levels)))
+
+	def update(self, value):
+		"""
+		Adds one value to the sketch
+		"""
+		if (value < self.min):
+			self.min = value
+		if (value > self.max):
+			self.max = value
+		self.n += 1
+		self._levels[0].append(value)
+		self._size += 1
+		if (self._size >= self._max_size):
+			self._compress()
+
+	def _compress(self):
+		"""
+		Compacts the lowest full levels until the sketch fits in its capacity
+		"""
+		for level in range(len(self._levels)):
+			items = self._levels[level]
+			if (len(items) >= self._capacity(level)):
+				if (level + 1 == len(self._levels)):
+					self._grow()
+				items.sort()
+				# An odd item out stays at this level
+				kept = [items.pop()] if len(items) % 2 == 1 else []
+				self._levels[level + 1].extend(items[self._random.randint(0, 1)::2])
+				self._levels[level] = kept
+				self._size = sum(len(items) for items in self._levels)
+				if (self._size < self._max_size):
+					break
+
+	def merge(self, other):
+		"""
+		Adds the values summarized by other (built with the same k) to this sketch
+		"""
+		if (other.k != self.k):
+			raise Exception("Can't merge sketches with different k: %d and %d" % (self.k, other.k))
+		while (len(self._levels) < len(other._levels)):
+			self._grow()
+		for (level, items) in enumerate(other._levels):
+			self._levels[level].extend(items)
+		self.n += other.n
+		self.min = min(self.min, other.min)
+		self.max = max(self.max, other.max)
+		self._size = sum(len(items) for items in self._levels)
+		while (self._size >= self._max_size):
+			self._compress()
+		return self
+
+	def quantiles(self, qs):
+		"""
+		Approximate quantiles qs (0 <= q <= 1): the item of rank ~ floor(q*(n - 1))
+		"""
+		if (self.n == 0):
+			raise Exception("quantiles of an empty sketch")
+		weighted = sorted((item, 1 << level) for (level, items) in enumerate(self._levels) for item in items)
+		results = []
+		for q in qs:
+			if (not 0 <= q <= 1):
+				raise Exception("Quantile out of range: " + str(q))
+			if (q == 0):
+				results.append(self.min)
+				continue
+			if (q == 1):
+				results.append(self.max)
+				continue
+			target = q * (self.n - 1)
+			cumulative_weight = 0
+			result = weighted[-1][0]
+			for (item, weight) in weighted:
+				cumulative_weight += weight
+				if (cumulative_weight > target):
+					result = item
+					break
+			results.append(result)
+		return results
+
+	def quantile(self, q):
+		return self.quantiles([q])[0]
+
+	def __len__(self):
+		return self.n
+
+	def to_bytes(self):
+		"""
+		Header (k, n, levels, min, max), the size of each level (uint32)
+		and the items of every level (float64)
+		"""
+		sizes = array("I", [len(items) for items in self._levels])
+		items = array("d", [item for items in self._levels for item in items])
+		return _HEADER.pack(self.k, self.n, len(self._levels), self.min, self.max) + sizes.tobytes() + items.tobytes()
+
+	@classmethod
+	def from_bytes(cls, data, seed = None):
+		(k, n, level_count, minimum, maximum) = _HEADER.unpack_from(data)
+		offset = _HEADER.size
+		sizes = array("I")
+		sizes.frombytes(data[offset : offset + level_count * sizes.itemsize])
+		offset += level_count * sizes.itemsize
+		items = array("d")
+		items.frombytes(data[offset:])
+		if (len(items) != sum(sizes)):
+			raise Exception("Corrupted sketch: %d items for levels of sizes %s" % (len(items), sizes.tolist()))
+
+		sketch = cls(k, seed)
+		sketch.n = n
+		sketch.min = minimum
+		sketch.max = maximum
+		sketch._levels = []
+		position = 0
+		for size in sizes:
+			sketch._levels.append(items[position : position + size].tolist())
+			position += size
+		sketch._size = len(items)
+		sketch._max_size = sum(sketch._capacity(level) for level in range(level_count))
+		return sketch
+
+# Tests
+
+def rank_error(values, value, exact_value):
+	"""
+	Distance between the ranks of value and of exact_value (the exact quantile
+	found by select), as a fraction of n. Equal values span a range of ranks,
+	so the error is 0 when the two ranges overlap
+	"""
+	(first, last) = _rank_range(values, value)
+	(exact_first, exact_last) = _rank_range(values, exact_value)
+	if (first > exact_last):
+		return (first - exact_last) / len(values)
+	if (exact_first > last):
+		return (exact_first - last) / len(values)
+	return 0
+
+def _rank_range(values, value):
+	"""
+	First and last ranks value would have in the sorted values
+	"""
+	less = 0
+	equal = 0
+	for other in values:
+		if (other < value):
+			less += 1
+		elif (other == value):
+			equal += 1
+	return (less, less + max(equal, 1) - 1)
+
+def test_kll_sketch(n = 200000, k = DEFAULT_K):
+	print("Running tests...")
+	qs = [0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1]
+	# Error bound with some margin over the expected ~1.7/k
+	epsilon = 3 / k
+	generator = random.Random(1)
+	streams = {
+		"random": [generator.random() for _ in range(n)],
+		"sorted": [float(i) for i in range(n)],
+		"few_unique": [float(generator.randint(1, 10)) for _ in range(n)],
+		"lognormal": [generator.lognormvariate(0, 2) for _ in range(n)],
+	}
+	for (name, values) in streams.items():
+		sketch = KLLSketch(k, seed=1)
+		start = time.perf_counter()
+		for value in values:
+			sketch.update(value)
+		update_time = time.perf_counter() - start
+
+		start = time.perf_counter()
+		exact = quantiles(values[:], qs)
+		select_time = time.perf_counter() - start
+
+		approximate = sketch.quantiles(qs)
+		errors = [rank_error(values, value, exact_value) for (value, exact_value) in zip(approximate, exact)]
+		if (max(errors) <= epsilon and approximate[0] == exact[0] and approximate[-1] == exact[-1]):
+			print("PASSED KLLSketch %-10s max rank error: %.4f - %d items kept, %.0f updates/s (select: %.3fs)"
+				% (name, max(errors), sketch._size, n / update_time, select_time))
+		else:
+			print("--> FAILED KLLSketch", name, "- Rank errors:", errors)
+
+	# Merged sketches of parts of the stream and serialization
+	values = streams["lognormal"]
+	parts = [KLLSketch(k, seed=i) for i in range(8)]
+	for (i, value) in enumerate(values):
+		parts[i % 8].update(value)
+	merged = KLLSketch(k, seed=1)
+	for part in parts:
+		merged.merge(KLLSketch.from_bytes(part.to_bytes()))
+	exact = quantiles(values[:], qs)
+	errors = [rank_error(values, value, exact_value) for (value, exact_value) in zip(merged.quantiles(qs), exact)]
+	restored = KLLSketch.from_bytes(merged.to_bytes())
+	if (len(merged) == n and max(errors) <= epsilon and restored.quantiles(qs) == merged.quantiles(qs)):
+		print("PASSED KLLSketch merge and bytes - max rank error: %.4f, %d bytes" % (max(errors), len(merged.to_bytes())))
+	else:
+		print("--> FAILED KLLSketch merge and bytes - Rank errors:", errors)
+
+def main():
+	test_kll_sketch()
+
+# Runs code
+if __name__ == "__main__":
+	main()
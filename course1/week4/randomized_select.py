@@ -1,32 +1,249 @@
+from bisect import bisect_left, bisect_right
+from typing import Literal
+import math
+import os
 import random
+import sys
+import time
 
-def _select(list, i, start, end):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import course_paths
+from instrumentation import Stats
+from quick_sort import insertion_sort, partition_three_way
+
+# Type definitions
+SelectMethod = Literal["random", "deterministic", "introselect", "floyd_rivest"]
+
+# Introselect checks its progress every INTROSELECT_CHECK_ITERATIONS partitions
+# and switches to median of medians pivots if the range didn't shrink to half
+INTROSELECT_CHECK_ITERATIONS = 2
+
+# Floyd-Rivest selects the pivots from a sample when the range is bigger than this
+FLOYD_RIVEST_SAMPLE_THRESHOLD = 600
+
+def _select(list, i, start, end, stats = None, three_way = False, method: SelectMethod = "random"):
+	"""
+	Finds the i-th smallest element of list[start..end], leaving it at index i
+
+	Iterative: each partition narrows [start, end] to the side that contains i
+
+	Time complexity:
+	- random: Best case/Average = O(n) / Worst case = O(n^2)
+	- deterministic/introselect: Worst case = O(n)
+	Space complexity: O(1) (O(log(n)) for the median of medians recursion)
+	"""
+	if (stats is not None):
+		stats.enter()
+
+	deterministic = (method == "deterministic")
+	checkpoint_size = end - start + 1
+	iterations = 0
+	while True:
+		iterations += 1
+		pivot_index = _median_of_medians(list, start, end, stats) if deterministic else None
+		# Median of medians pivots are partitioned three way: with two way partitions
+		# a run of equal elements would still be peeled one at a time
+		if (three_way or deterministic):
+			(first_equal, last_equal) = partition_three_way(list, start, end, stats, pivot_index)
+		else:
+			(first_equal, pivot) = partition(list, start, end, stats, pivot_index)
+			last_equal = first_equal
+
+		if (first_equal <= i <= last_equal):
+			break
+		elif (i > last_equal):
+			start = last_equal + 1
+		else:
+			end = first_equal - 1
+
+		if (method == "introselect" and not deterministic and iterations % INTROSELECT_CHECK_ITERATIONS == 0):
+			size = end - start + 1
+			# Random pivots are stalling, guarantees linear time from here
+			deterministic = (size > checkpoint_size // 2)
+			checkpoint_size = size
+
+	if (stats is not None):
+		stats.calls += iterations - 1
+		stats.exit()
+	return list[i]
+
+def _median_of_medians(list, start, end, stats = None):
+	"""
+	Returns the index of a pivot of list[start..end] that has at least
+	~30% of the elements on each side: the median of the medians of groups of 5.
+	The group medians are moved to the beginning of the range
+	"""
+	n = end - start + 1
+	if (n <= 5):
+		insertion_sort(list, start, end, stats)
+		return start + (n - 1) // 2
+
+	medians_end = start
+	for group_start in range(start, end + 1, 5):
+		group_end = min(group_start + 4, end)
+		insertion_sort(list, group_start, group_end, stats)
+		median = group_start + (group_end - group_start) // 2
+		list[medians_end], list[median] = list[median], list[medians_end]
+		medians_end += 1
+
+	middle = start + (medians_end - start - 1) // 2
+	_select(list, middle, start, medians_end - 1, stats, method="deterministic")
+	return middle
+
+def _floyd_rivest_select(list, k, left, right, stats = None):
+	"""
+	Floyd-Rivest selection: leaves the k-th smallest element of list[left..right] at index k
+
+	For big ranges, a sample of ~n^(2/3) elements around the expected position of k
+	is selected recursively first, so the partition pivot lands very close to k and the
+	range shrinks to a small window around it.
+	Comparisons: n + min(k, n - k) + o(n) on average
+	"""
+	if (stats is not None):
+		stats.enter()
+
+	comparisons = 0
+	swaps = 0
+	while (right > left):
+		if (right - left > FLOYD_RIVEST_SAMPLE_THRESHOLD):
+			n = right - left + 1
+			i = k - left + 1
+			z = math.log(n)
+			sample_size = 0.5 * math.exp(2 * z / 3)
+			deviation = 0.5 * math.sqrt(z * sample_size * (n - sample_size) / n) * (1 if 2*i >= n else -1)
+			new_left = max(left, int(k - i * sample_size / n + deviation))
+			new_right = min(right, int(k + (n - i) * sample_size / n + deviation))
+			_floyd_rivest_select(list, k, new_left, new_right, stats)
+
+		# Hoare partition around t = list[k], with list[left] and list[right] as sentinels
+		t = list[k]
+		i = left
+		j = right
+		list[left], list[k] = list[k], list[left]
+		if (list[right] > t):
+			list[right], list[left] = list[left], list[right]
+			swaps += 1
+		rounds = 0
+		while (i < j):
+			list[i], list[j] = list[j], list[i]
+			i += 1
+			j -= 1
+			while (list[i] < t):
+				i += 1
+			while (list[j] > t):
+				j -= 1
+			rounds += 1
+		# Every scanned position is one comparison, plus a failed one at each stop
+		comparisons += (i - left) + (right - j) + 2
+		swaps += rounds + 2
+
+		if (list[left] == t):
+			list[left], list[j] = list[j], list[left]
+		else:
+			j += 1
+			list[j], list[right] = list[right], list[j]
+
+		# t is at j, continue on the side that contains k
+		if (j <= k):
+			left = j + 1
+		if (k <= j):
+			right = j - 1
+
+	if (stats is not None):
+		stats.comparisons += comparisons
+		stats.swaps += swaps
+		stats.exit()
+
+def select(list, i, stats = None, three_way = False, method: SelectMethod = "random"):
+	"""
+	Finds the i-th smallest element (i from 0), reordering the list
+
+	three_way - uses partition_three_way, for inputs with many duplicates
+	method:
+	- random - random pivots
+	- deterministic - median of medians pivots (same as dselect)
+	- introselect - random pivots, median of medians once the range stops halving
+	- floyd_rivest - pivots selected from a sample, fewest comparisons for big lists
+	(three_way is not needed, its partition already splits runs of equal elements)
+	"""
+	if (method not in ("random", "deterministic", "introselect", "floyd_rivest")):
+		raise Exception("Unknown select method: " + str(method))
+	if (method == "floyd_rivest"):
+		_floyd_rivest_select(list, i, 0, len(list) - 1, stats)
+		return list[i]
+	return _select(list, i, 0, len(list) - 1, stats, three_way, method)
+
+def dselect(list, i, stats = None, three_way = False):
+	"""
+	Deterministic select (median of medians), worst case O(n)
+	"""
+	return select(list, i, stats, three_way, "deterministic")
+
+def select_many(list, ranks, stats = None, method: SelectMethod = "random"):
 	"""
-	Finds the i-th smallest element
+	Finds the elements of several ranks (i from 0) at once, reordering the list
+	Returns them in the same order as ranks
+
+	Multiselect: each three way partition sends the pending ranks to the side that
+	contains them, ranges without pending ranks are never partitioned again
 
-	Time complexity: Best case/Average = O(n) / Worst case = O(n^2)
-	Space complexity: O(1)
+	method - "random" or "deterministic" (median of medians) pivots
+	Time complexity: O(n*log(k)) on average for k ranks (O(k*n) calling select k times)
 	"""
-	(pivot_index, pivot) = partition(list, start, end)
+	if (method not in ("random", "deterministic")):
+		raise Exception("Unknown select_many method: " + str(method))
+	n = len(list)
+	for i in ranks:
+		if (not 0 <= i < n):
+			raise Exception("Rank out of range: " + str(i))
+
+	if (stats is not None):
+		stats.enter()
 
-	if (pivot_index == i):
-		return pivot
-	elif (i > pivot_index):
-		return _select(list, i, pivot_index + 1, end)
-	elif (i < pivot_index):
-		return _select(list, i, start, pivot_index - 1)
+	pending = sorted(set(ranks))
+	# (start, end, first pending rank, last pending rank + 1) of the ranges left
+	ranges = [(0, n - 1, 0, len(pending))] if pending else []
+	iterations = 0
+	while (ranges):
+		(start, end, first_rank, last_rank) = ranges.pop()
+		iterations += 1
+		pivot_index = _median_of_medians(list, start, end, stats) if method == "deterministic" else None
+		(first_equal, last_equal) = partition_three_way(list, start, end, stats, pivot_index)
 
-def select(list, i):
-	return _select(list, i, 0, len(list) - 1)
+		# Ranks in [first_equal, last_equal] are found
+		left_end = bisect_left(pending, first_equal, first_rank, last_rank)
+		right_start = bisect_right(pending, last_equal, left_end, last_rank)
+		if (first_rank < left_end):
+			ranges.append((start, first_equal - 1, first_rank, left_end))
+		if (right_start < last_rank):
+			ranges.append((last_equal + 1, end, right_start, last_rank))
 
-def partition(list, start, end):
+	if (stats is not None):
+		stats.calls += iterations - 1
+		stats.exit()
+	return [list[i] for i in ranks]
+
+def quantiles(list, qs, stats = None, method: SelectMethod = "random"):
+	"""
+	Returns the quantiles qs (0 <= q <= 1) of the list with select_many, reordering it
+	The q quantile is the element of rank floor(q*(n - 1)) (NumPy's "lower" method)
 	"""
-	Randomly selects an element of the array as pivot
+	if (len(list) == 0):
+		raise Exception("quantiles of an empty list")
+	for q in qs:
+		if (not 0 <= q <= 1):
+			raise Exception("Quantile out of range: " + str(q))
+	return select_many(list, [int(q * (len(list) - 1)) for q in qs], stats, method)
+
+def partition(list, start, end, stats = None, pivot_index = None):
+	"""
+	Randomly selects an element of the array as pivot (unless pivot_index is given)
 	then rearrange the array such that every element to the left of the array
 	is less than the pivot and every element to the right of the array is greater than the pivot
 	"""
 	# Randomly selects a pivot
-	pivot_index = random.randint(start, end)
+	if (pivot_index is None):
+		pivot_index = random.randint(start, end)
 	pivot = list[pivot_index]
 
 	# Moves pivot to the end
@@ -43,6 +260,11 @@ def partition(list, start, end):
 	list[end] = list[i + 1]
 	list[i + 1] = pivot
 
+	if (stats is not None):
+		stats.comparisons += end - start
+		# Swaps inside the loop + moving the pivot to the end and back
+		stats.swaps += (i - start + 1) + 2
+
 	return (i + 1, pivot) # Pivot index / Pivot
 
 def test_select():
@@ -63,4 +285,199 @@ def test_select():
 	else:
 		print("--> FAILED select")
 
-test_select()
+def test_select_instrumentation():
+	test_list = random.sample(range(1,20000), 10000)
+	stats = Stats("select")
+	found_element = select(test_list, 5000, stats)
+	# At least n - 1 comparisons (first partition), iterative so no nesting
+	if (found_element == sorted(test_list)[5000] and stats.comparisons >= 9999
+		and stats.calls >= 1 and stats.max_depth == 1 and stats.depth == 0):
+		print("PASSED select instrumentation")
+	else:
+		print("--> FAILED select instrumentation -", stats)
+
+def test_select_three_way():
+	passed = True
+	for _ in range(1000):
+		list_size = random.randint(1, 1500)
+		test_list = [random.randint(1, random.choice([1, 3, 10, 2000])) for _ in range(list_size)]
+		desired_position = random.randint(0, list_size - 1)
+		expected_element = sorted(test_list)[desired_position]
+		if (select(test_list, desired_position, three_way=True) != expected_element):
+			passed = False
+			break
+	if(passed):
+		print("PASSED select three way")
+	else:
+		print("--> FAILED select three way")
+
+def test_select_methods():
+	for method in ("deterministic", "introselect"):
+		passed = True
+		for _ in range(300):
+			list_size = random.randint(1, 1500)
+			test_list = [random.randint(1, random.choice([1, 3, 10, 2000])) for _ in range(list_size)]
+			# Adversarial orders for fixed pivot positions
+			if (random.random() < 0.3):
+				test_list.sort(reverse=random.random() < 0.5)
+			desired_position = random.randint(0, list_size - 1)
+			expected_element = sorted(test_list)[desired_position]
+			three_way = random.random() < 0.5
+			if (select(test_list, desired_position, three_way=three_way, method=method) != expected_element
+				or test_list[desired_position] != expected_element):
+				passed = False
+				break
+		if (passed):
+			print("PASSED select", method)
+		else:
+			print("--> FAILED select", method, "- Position:", desired_position, "Three way:", three_way)
+
+	# Median of medians keeps at least ~30% on each side, so comparisons stay linear
+	test_list = list(range(100000))
+	stats = Stats("dselect")
+	if (dselect(test_list, 99000, stats) == 99000 and stats.comparisons < 40 * 100000 and stats.depth == 0):
+		print("PASSED dselect linear comparisons -", stats.comparisons)
+	else:
+		print("--> FAILED dselect linear comparisons -", stats)
+
+	# Iterative, no RecursionError when two way partitions peel one element at a time
+	test_list = [1] * 5000
+	if (select(test_list, 4999) == 1):
+		print("PASSED select without recursion")
+	else:
+		print("--> FAILED select without recursion")
+
+def test_select_many():
+	passed = True
+	for _ in range(300):
+		list_size = random.randint(1, 1500)
+		test_list = [random.randint(1, random.choice([1, 3, 10, 2000])) for _ in range(list_size)]
+		ranks = [random.randint(0, list_size - 1) for _ in range(random.randint(0, 10))]
+		method = random.choice(["random", "deterministic"])
+		sorted_list = sorted(test_list)
+		if (select_many(test_list, ranks, method=method) != [sorted_list[i] for i in ranks]):
+			passed = False
+			break
+	if (passed):
+		print("PASSED select_many")
+	else:
+		print("--> FAILED select_many - Ranks:", ranks, "Method:", method)
+
+	test_list = [random.random() for _ in range(10001)]
+	sorted_list = sorted(test_list)
+	qs = [0.5, 0.9, 0.95, 0.99, 0.999, 0, 1]
+	stats = Stats("quantiles")
+	result = quantiles(test_list, qs, stats)
+	if (result == [sorted_list[int(q * 10000)] for q in qs] and stats.depth == 0):
+		print("PASSED quantiles")
+	else:
+		print("--> FAILED quantiles -", result)
+
+def run_quantiles_benchmark(n = 1000000):
+	"""
+	p50, p90, p95, p99 and p99.9 with select_many vs one select call per quantile
+	"""
+	print()
+	print("Benchmark - 5 quantiles of %d random values" % n)
+	column = [random.random() for _ in range(n)]
+	qs = [0.5, 0.9, 0.95, 0.99, 0.999]
+	engines = [
+		("select x5", lambda values, stats: [select(values, int(q * (n - 1)), stats) for q in qs]),
+		("quantiles", lambda values, stats: quantiles(values, qs, stats)),
+	]
+	for (name, engine) in engines:
+		stats = Stats(name)
+		start = time.perf_counter()
+		engine(column[:], stats)
+		elapsed = time.perf_counter() - start
+		print("%-10s %8.3fs  comparisons: %d" % (name, elapsed, stats.comparisons))
+
+def test_floyd_rivest():
+	passed = True
+	for _ in range(300):
+		list_size = random.randint(1, 3000)
+		test_list = [random.randint(1, random.choice([1, 3, 10, 10**6])) for _ in range(list_size)]
+		if (random.random() < 0.3):
+			test_list.sort(reverse=random.random() < 0.5)
+		desired_position = random.randint(0, list_size - 1)
+		expected_element = sorted(test_list)[desired_position]
+		if (select(test_list, desired_position, method="floyd_rivest") != expected_element):
+			passed = False
+			break
+	if (passed):
+		print("PASSED select floyd_rivest")
+	else:
+		print("--> FAILED select floyd_rivest - Position:", desired_position)
+
+	# About n + min(k, n - k) comparisons for the median (random pivots need ~3.4n)
+	test_list = [random.random() for _ in range(100001)]
+	expected_element = sorted(test_list)[50000]
+	stats = Stats("floyd_rivest")
+	if (select(test_list, 50000, stats, method="floyd_rivest") == expected_element
+		and stats.comparisons < 2 * 100001 and stats.depth == 0):
+		print("PASSED floyd_rivest comparisons -", stats.comparisons)
+	else:
+		print("--> FAILED floyd_rivest comparisons -", stats)
+
+def run_floyd_rivest_benchmark(n = 1000000):
+	"""
+	Random pivots vs Floyd-Rivest at the median and at tail ranks
+	"""
+	print()
+	print("Benchmark - random vs floyd_rivest on %d random values" % n)
+	column = [random.random() for _ in range(n)]
+	for (name, rank) in (("p1", n // 100), ("p50", n // 2), ("p99", n * 99 // 100), ("p99.9", n * 999 // 1000)):
+		for method in ("random", "floyd_rivest"):
+			stats = Stats(method)
+			start = time.perf_counter()
+			select(column[:], rank, stats, method=method)
+			elapsed = time.perf_counter() - start
+			print("%-6s %-13s %8.3fs  comparisons: %9d (%.2fn)" % (name, method, elapsed, stats.comparisons, stats.comparisons / n))
+
+def run_latency_benchmark(n = 1000000):
+	"""
+	p99 of random values with each select method
+	"""
+	print()
+	print("Benchmark - p99 of %d random values" % n)
+	column = [random.random() for _ in range(n)]
+	for method in ("random", "deterministic", "introselect"):
+		stats = Stats(method)
+		start = time.perf_counter()
+		select(column[:], n * 99 // 100, stats, method=method)
+		elapsed = time.perf_counter() - start
+		print("%-13s %8.3fs  comparisons: %d" % (method, elapsed, stats.comparisons))
+
+def run_duplicates_benchmark():
+	"""
+	Two way vs three way partitioning on a column with 10 distinct values
+	Run with: python randomized_select.py benchmark
+	"""
+	print()
+	print("Benchmark - p95 of a column with 10 distinct values")
+	for (n, engines) in ((5000, (False, True)), (1000000, (True,))):
+		column = [random.randint(1, 10) for _ in range(n)]
+		for three_way in engines:
+			stats = Stats("three_way" if three_way else "two_way")
+			start = time.perf_counter()
+			select(column[:], n * 95 // 100, stats, three_way)
+			elapsed = time.perf_counter() - start
+			print("n = %7d - %-9s %8.3fs  comparisons: %d" % (n, stats.name, elapsed, stats.comparisons))
+	print("(two way peels equal elements one at a time, O(n^2) at n = 1000000)")
+
+def main():
+	test_select()
+	test_select_instrumentation()
+	test_select_three_way()
+	test_select_methods()
+	test_select_many()
+	test_floyd_rivest()
+	if ("benchmark" in sys.argv[1:]):
+		run_duplicates_benchmark()
+		run_latency_benchmark()
+		run_quantiles_benchmark()
+		run_floyd_rivest_benchmark()
+
+# Runs code
+if __name__ == "__main__":
+	main()
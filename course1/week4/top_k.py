@@ -0,0 +1,182 @@
+"""
+    Author: Leonardo Ribeiro
+    Python Version: 3.8.10
+
+	Top k and partial sort
+
+	Only the k smallest (or largest) elements are sorted:
+	1. select (partition until the k-th element is in place) moves the k smallest
+	elements to the beginning of the list - O(n) on average. Its three way
+	partition keeps that bound when the list has many duplicates
+	2. intro sort sorts just that prefix - O(k*log(k))
+
+	Iterators that can't be kept in memory go through a bounded heap of k
+	elements instead - O(n*log(k)) time, O(k) memory.
+"""
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import course_paths
+from instrumentation import Stats
+from quick_sort import intro_sort
+from randomized_select import select
+
+def partial_sort(list, k, stats = None):
+	"""
+	Reorders the list so list[0..k - 1] are its k smallest elements, sorted
+	(the rest of the list is left in no particular order). Returns the list
+
+	Time complexity: O(n + k*log(k)) on average
+	"""
+	n = len(list)
+	k = min(k, n)
+	if (k <= 0):
+		return list
+	if (k < n):
+		select(list, k - 1, stats, three_way=True)
+	intro_sort(list, 0, k - 1, stats)
+	return list
+
+def top_k(data, k, largest = False, stats = None, in_place = False):
+	"""
+	Returns the k smallest (or largest) elements of data, sorted (largest first when largest)
+
+	Lists are partially sorted with select, on a copy unless in_place is True
+	(like heapq.nsmallest, data is left untouched by default). Any other iterable
+	is streamed through a bounded heap with top_k_stream (stats is ignored)
+	"""
+	if (not isinstance(data, list)):
+		return top_k_stream(data, k, largest)
+
+	n = len(data)
+	k = min(k, n)
+	if (k <= 0):
+		return []
+	if (not in_place):
+		data = data[:]
+		if (stats is not None):
+			stats.allocations += n
+	if (not largest):
+		return partial_sort(data, k, stats)[:k]
+
+	# The k largest end up at the end of the list, in ascending order
+	if (k < n):
+		select(data, n - k, stats, three_way=True)
+	intro_sort(data, n - k, n - 1, stats)
+	return data[n - k:][::-1]
+
+class _Descending:
+	"""
+	Reverses the order of a value, so heapq's min heap works as a max heap
+	"""
+	__slots__ = ("value",)
+
+	def __init__(self, value):
+		self.value = value
+
+	def __lt__(self, other):
+		return other.value < self.value
+
+def top_k_stream(iterable, k, largest = False):
+	"""
+	Top k of an iterable with a heap of at most k elements
+
+	The heap root is the worst of the k best elements seen so far: the largest
+	when looking for the smallest ones and vice versa. Each new element only
+	enters the heap if it's better than the root
+	"""
+	if (k <= 0):
+		return []
+
+	iterator = iter(iterable)
+	wrap = (lambda value: value) if largest else _Descending
+	heap = []
+	for value in iterator:
+		heap.append(wrap(value))
+		if (len(heap) == k):
+			break
+	heapq.heapify(heap)
+
+	if (largest):
+		for value in iterator:
+			if (heap[0] < value):
+				heapq.heapreplace(heap, value)
+		return sorted(heap, reverse=True)
+
+	for value in iterator:
+		if (value < heap[0].value):
+			heapq.heapreplace(heap, _Descending(value))
+	return sorted(item.value for item in heap)
+
+# Tests
+
+def test_top_k():
+	print("Running tests...")
+	passed = True
+	for _ in range(500):
+		n = random.randint(0, 1500)
+		test_list = [random.randint(1, random.choice([3, 10, 2000])) for _ in range(n)]
+		k = random.randint(-1, n + 2)
+		largest = random.random() < 0.5
+		expected = sorted(test_list, reverse=largest)[: max(k, 0)]
+		stream_result = top_k(iter(test_list), k, largest)
+		original = test_list[:]
+		list_result = top_k(test_list, k, largest)
+		in_place_result = top_k(test_list[:], k, largest, in_place=True)
+		if (list_result != expected or stream_result != expected or in_place_result != expected or test_list != original):
+			passed = False
+			break
+	if (passed):
+		print("PASSED top_k (list and stream)")
+	else:
+		print("--> FAILED top_k - k:", k, "Largest:", largest)
+
+	test_list = random.sample(range(100000), 50000)
+	expected_prefix = sorted(test_list)[:100]
+	stats = Stats("partial_sort")
+	partial_sort(test_list, 100, stats)
+	if (test_list[:100] == expected_prefix and sorted(test_list[100:])[0] > expected_prefix[-1]
+		and stats.comparisons < 10 * 50000):
+		print("PASSED partial_sort -", stats.comparisons, "comparisons")
+	else:
+		print("--> FAILED partial_sort -", stats)
+
+	# Two way partitions would make this quadratic (about 10^8 comparisons)
+	test_list = [random.randint(1, 2) for _ in range(20000)]
+	stats = Stats("top_k")
+	result = top_k(test_list, 10000, largest=True, stats=stats)
+	if (result == sorted(test_list, reverse=True)[:10000] and stats.comparisons < 20 * 20000):
+		print("PASSED top_k with duplicates -", stats.comparisons, "comparisons")
+	else:
+		print("--> FAILED top_k with duplicates -", stats)
+
+def run_benchmark(n = 1000000, k = 100):
+	"""
+	Run with: python top_k.py benchmark
+	"""
+	print()
+	print("Benchmark - %d smallest of %d random values" % (k, n))
+	data = [random.random() for _ in range(n)]
+	engines = [
+		("intro_sort", lambda values: intro_sort(values, 0, n - 1)),
+		("top_k", lambda values: top_k(values, k)),
+		("top_k_stream", lambda values: top_k_stream(iter(values), k)),
+	]
+	for (name, engine) in engines:
+		values = data[:]
+		start = time.perf_counter()
+		engine(values)
+		print("%-13s %.3fs" % (name, time.perf_counter() - start))
+
+def main():
+	test_top_k()
+	if ("benchmark" in sys.argv[1:]):
+		run_benchmark()
+
+# Runs code
+if __name__ == "__main__":
+	main()